@@ -1,10 +1,29 @@
 from flask import Flask, render_template, request, redirect, url_for, session, g, flash, jsonify
+import click
 import os
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+
+from backup import (
+    KEEP, PAGES_PER_STEP, SHIP_INTERVAL, STEP_PAUSE, WalShipper, configure_connection, create_snapshot,
+    list_generations, restore_generation, verify_generation,
+)
+from patient_dedup import find_existing_patient, run_dedup
+from patient_search import PAGE_SIZE, ensure_patient_index, search_patients
+from purge import (
+    active_job, create_job, dentist_appointments, job_progress, pending_jobs, requeue_failed, resume_jobs, run_job,
+    start_worker,
+)
+from reporting import ensure_rollups, rebuild_rollups, rollup_report
+from schedule import (
+    CLINIC_SLOTS, DAY_NAMES, DEFAULT_HOURS, booked_masks, earliest_slots, format_intervals, get_schedule,
+    mask_times, migrate_legacy_hours, normalize_time, parse_intervals, set_weekly_hours, slot_of, slot_time,
+    to_minutes, weekly_hours,
+)
 
 DATABASE = os.path.join(os.path.dirname(__file__), 'dentalcare.db')
 SECRET_KEY = os.environ.get('FLASK_SECRET_KEY', 'change-me')
+BACKUP_DIR = os.environ.get('DENTALCARE_BACKUP_DIR', os.path.join(os.path.dirname(__file__), 'backups'))
 
 # ---- DB Helpers ----
 
@@ -12,6 +31,7 @@ def get_db():
     if 'db' not in g:
         g.db = sqlite3.connect(DATABASE)
         g.db.row_factory = sqlite3.Row
+        configure_connection(g.db)
     return g.db
 
 
@@ -34,18 +54,121 @@ def create_app():
     app = Flask(__name__, template_folder='templates', static_folder='static')
     app.secret_key = SECRET_KEY
 
+    purge_resumed = []
+
     @app.before_request
     def before_request():
-        get_db()
+        db = get_db()
+        # Pick up purges interrupted by a restart once the app is serving again
+        if not purge_resumed:
+            purge_resumed.append(True)
+            resume_jobs(DATABASE, db)
 
     @app.teardown_appcontext
     def teardown_db(_):
         close_db()
 
-    # Ensure DB exists with tables
-    if not os.path.exists(DATABASE) or os.path.getsize(DATABASE) == 0:
-        with app.app_context():
-            init_db()
+    # Ensure DB exists with tables and bring older databases up to the current schema
+    with app.app_context():
+        init_db()
+        # WAL lets page loads keep reading while background jobs write
+        get_db().execute("PRAGMA journal_mode=WAL")
+        migrate_legacy_hours(get_db())
+        ensure_rollups(get_db())
+        ensure_patient_index(get_db())
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recompute the reporting rollups from tbl_appointments"""
+        rebuild_rollups(get_db())
+        print('Reporting rollups rebuilt.')
+
+    @app.cli.command('dedup-patients')
+    @click.option('--batch-size', default=500, show_default=True, help='Patients scanned per checkpoint.')
+    @click.option('--max-batches', type=int, default=None, help='Stop after this many batches (resume later).')
+    @click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and rescan from the first patient.')
+    def dedup_patients_command(batch_size, max_batches, restart):
+        """Merge duplicate patient records, resuming from the last checkpoint"""
+        scanned, merges, finished = run_dedup(get_db(), batch_size, max_batches, restart, progress=print)
+        print(f"{'Finished' if finished else 'Paused'}: scanned {scanned} patients, merged {merges} duplicates.")
+
+    @app.cli.command('purge-resume')
+    @click.option('--retry-failed', is_flag=True, help='Also rerun jobs that stopped with an error.')
+    def purge_resume_command(retry_failed):
+        """Run queued or interrupted purge jobs in the foreground"""
+        db = get_db()
+        if retry_failed:
+            requeue_failed(db)
+        for job_id in pending_jobs(db):
+            run_job(db, job_id)
+            job = db.execute("SELECT * FROM tbl_purge_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            print(f"Job {job_id} ({job['kind']}): {job['status']}, deleted {job['deleted']} rows.")
+
+    @app.cli.command('backup')
+    @click.option('--pages', default=PAGES_PER_STEP, show_default=True, help='Pages copied per backup step.')
+    @click.option('--pause', default=STEP_PAUSE, show_default=True, help='Seconds to sleep between steps.')
+    @click.option('--keep', default=KEEP, show_default=True, help='Snapshots to keep; older ones are deleted.')
+    def backup_command(pages, pause, keep):
+        """Take a compressed, checksummed snapshot of the live database"""
+        m = create_snapshot(DATABASE, BACKUP_DIR, pages, pause, keep)
+        print(f"Snapshot {m['generation']}: {m['size'] / 2**20:.1f} MiB -> {m['compressed_size'] / 2**20:.1f} MiB, "
+              f"copied in {m['copy_seconds']}s, {m['total_seconds']}s total.")
+
+    @app.cli.command('backup-verify')
+    @click.argument('generation', required=False)
+    def backup_verify_command(generation):
+        """Check snapshot checksums, replay shipped WAL and run an integrity check"""
+        manifests = [m for m in list_generations(BACKUP_DIR) if generation in (None, m['generation'])]
+        if not manifests:
+            raise click.ClickException('No matching backups found.')
+        failed = False
+        for m in manifests:
+            ok, message = verify_generation(BACKUP_DIR, m)
+            failed = failed or not ok
+            print(f"{m['generation']}: {'OK' if ok else 'FAILED'} ({message})")
+        if failed:
+            raise SystemExit(1)
+
+    @app.cli.command('backup-restore')
+    @click.argument('generation')
+    @click.argument('target')
+    @click.option('--until', help='Replay shipped WAL up to this ISO time (UTC unless an offset is given).')
+    @click.option('--force', is_flag=True, help='Allow overwriting the live database (stop the app first).')
+    def backup_restore_command(generation, target, until, force):
+        """Restore a backup generation to TARGET"""
+        manifest = next((m for m in list_generations(BACKUP_DIR) if m['generation'] == generation), None)
+        if not manifest:
+            raise click.ClickException(f'Backup {generation} not found.')
+        if os.path.abspath(target) == os.path.abspath(DATABASE) and not force:
+            raise click.ClickException('Refusing to overwrite the live database without --force.')
+        until_at = None
+        if until:
+            try:
+                until_at = datetime.fromisoformat(until)
+            except ValueError:
+                raise click.ClickException('--until must be an ISO date-time, e.g. 2026-03-01T14:30.')
+            if until_at.tzinfo is None:
+                until_at = until_at.replace(tzinfo=timezone.utc)
+            if until_at < datetime.fromisoformat(manifest['created_at']):
+                raise click.ClickException(f"--until is before snapshot {generation} was taken; pick an older backup.")
+        try:
+            applied = restore_generation(BACKUP_DIR, manifest, target, until_at)
+        except (OSError, ValueError, sqlite3.DatabaseError) as e:
+            raise click.ClickException(f'Restore failed, {target} left untouched: {e}')
+        print(f"Restored {generation} to {target} ({applied} WAL segments applied).")
+
+    @app.cli.command('backup-ship')
+    @click.option('--interval', default=SHIP_INTERVAL, show_default=True, help='Seconds between WAL polls.')
+    @click.option('--keep', default=KEEP, show_default=True, help='Shipped generations to keep.')
+    def backup_ship_command(interval, keep):
+        """Continuously ship WAL frames for point-in-time recovery (run the app with DENTALCARE_WAL_SHIPPING=1)"""
+        shipper = WalShipper(DATABASE, BACKUP_DIR, keep)
+        try:
+            shipper.run(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            shipper.close()
 
     # ---- Utility ----
     def current_user():
@@ -99,6 +222,8 @@ def create_app():
             if not name or not age or not address or not contact:
                 flash('Please complete all required fields.', 'error')
                 return render_template('request.html', user=current_user(), form=request.form)
+            # Always a new row: the patient row is the request staff pick up, so reusing
+            # an existing record here would leave nothing for them to act on
             g.db.execute(
                 "INSERT INTO tbl_patients (pat_name, pat_age, pat_sex, pat_contact, pat_address) VALUES (?, ?, ?, ?, ?)",
                 (name, age, sex, contact, address)
@@ -111,34 +236,36 @@ def create_app():
 
     def get_available_times(dentist_id, app_date):
         """Get available time slots for a dentist on a given date"""
-        # Get dentist's working hours
-        den = g.db.execute("SELECT work_start, work_end, work_days FROM tbl_dentists WHERE dentist_id=?", (dentist_id,)).fetchone()
-        if not den:
+        try:
+            mask = get_schedule(g.db).day_mask(dentist_id, app_date) & CLINIC_SLOTS
+        except ValueError:
             return []
-
-        # Check if dentist works on this day
-        day_of_week = datetime.strptime(app_date, '%Y-%m-%d').strftime('%A')
-        if day_of_week not in (den['work_days'] or 'Monday,Tuesday,Wednesday,Thursday,Friday'):
+        if not mask:
             return []
 
-        # Get all booked times for this dentist on this date
-        booked = g.db.execute(
-            "SELECT app_time FROM tbl_appointments WHERE dentist_id=? AND app_date=? AND app_status IN ('Approved', 'Scheduled')",
-            (dentist_id, app_date)
-        ).fetchall()
-        booked_times = {b['app_time'] for b in booked}
-
-        # Generate all possible times between work_start and work_end (30-min intervals)
-        all_times = [
-            '09:00', '09:30', '10:00', '10:30', '11:00', '11:30',
-            '13:00', '13:30', '14:00', '14:30', '15:00', '15:30'
-        ]
+        # Clear the slots already taken on this date
+        booked = booked_masks(g.db, app_date, app_date, [dentist_id])
+        return mask_times(mask & ~booked.get((dentist_id, app_date), 0))
 
-        # Filter to only times within working hours and not booked
-        work_start = den['work_start'] or '08:00'
-        work_end = den['work_end'] or '17:00'
-        available = [t for t in all_times if work_start <= t < work_end and t not in booked_times]
-        return available
+    def check_dentist_schedule(dentist_id, app_date, app_time):
+        """Return an error message if the dentist is not on duty at that date and time, else None"""
+        compiled = get_schedule(g.db)
+        if not compiled.has_schedule(dentist_id):
+            return 'Dentist schedule not configured'
+        try:
+            day_of_week = DAY_NAMES[datetime.fromisoformat(app_date).weekday()]
+            # Same grid get_available_times offers, so only offered times pass
+            mask = compiled.day_mask(dentist_id, app_date) & CLINIC_SLOTS
+            slot = slot_of(app_time)
+        except ValueError:
+            return 'Invalid date or time'
+        if app_date in compiled.holidays:
+            return f"The clinic is closed on {app_date} ({compiled.holidays[app_date]})"
+        if not mask:
+            return f'Selected dentist does not work on {day_of_week}, {app_date}'
+        if slot_time(slot) != app_time or not mask >> slot & 1:
+            return f"Dentist available only at: {', '.join(mask_times(mask))}"
+        return None
 
     @app.route('/book', methods=['GET', 'POST'])
     def book_appointment():
@@ -166,63 +293,44 @@ def create_app():
             else:
                 try:
                     # Validate dentist schedule
-                    den = g.db.execute(
-                        "SELECT work_start, work_end, work_days FROM tbl_dentists WHERE dentist_id=?",
-                        (dentist_id,)
-                    ).fetchone()
-
-                    if not den:
-                        flash('Dentist schedule not configured', 'error')
+                    schedule_error = check_dentist_schedule(dentist_id, app_date, app_time)
+                    if schedule_error:
+                        flash(schedule_error, 'error')
                     else:
-                        day_of_week = datetime.strptime(app_date, '%Y-%m-%d').strftime('%A')
-                        if day_of_week not in (den['work_days'] or ''):
-                            flash(f'Selected dentist does not work on {day_of_week}', 'error')
-                        else:
-                            # Check time within working hours
-                            app_time_obj = datetime.strptime(app_time, '%H:%M')
-                            work_start_obj = datetime.strptime(den['work_start'], '%H:%M')
-                            work_end_obj = datetime.strptime(den['work_end'], '%H:%M')
-
-                            if not (work_start_obj <= app_time_obj < work_end_obj):
-                                flash(f"Dentist available only between {den['work_start']} and {den['work_end']}", 'error')
-                            else:
-                                # Get service price
-                                service_row = g.db.execute(
-                                    "SELECT service_price FROM tbl_services WHERE service_name = ?",
-                                    (app_service,)
-                                ).fetchone()
-                                service_price = service_row['service_price'] if service_row else 50.00
-
-                                # Insert patient (linked to customer if logged in)
-                                g.db.execute(
-                                    "INSERT INTO tbl_patients (pat_name, pat_age, pat_sex, pat_contact, pat_address, customer_id) VALUES (?, ?, ?, ?, ?, ?)",
-                                    (name, age, 'M', contact, address, cid)
-                                )
-                                g.db.commit()
-
-                                # Get new patient ID
-                                pat = g.db.execute(
-                                    "SELECT pat_id FROM tbl_patients WHERE pat_name = ? AND pat_contact = ? ORDER BY pat_id DESC LIMIT 1",
-                                    (name, contact)
-                                ).fetchone()
-
-                                if pat:
-                                    # Insert appointment
-                                    g.db.execute(
-                                        "INSERT INTO tbl_appointments (pat_id, dentist_id, app_date, app_time, app_service, app_service_price, app_status, payment_status) VALUES (?, ?, ?, ?, ?, ?, 'Pending', 'Unpaid')",
-                                        (pat['pat_id'], dentist_id, app_date, app_time, app_service, service_price)
-                                    )
-                                    g.db.commit()
-
-                                    # Log and redirect
-                                    app = g.db.execute(
-                                        "SELECT app_id FROM tbl_appointments WHERE pat_id = ? ORDER BY app_id DESC LIMIT 1",
-                                        (pat['pat_id'],)
-                                    ).fetchone()
-
-                                    log_action(cid, 'appointment_book', f"pat:{pat['pat_id']} dentist:{dentist_id} {app_date} {app_time}")
-                                    session['pending_appointment'] = app['app_id']
-                                    return redirect(url_for('appointment_payment'))
+                        # Get service price
+                        service_row = g.db.execute(
+                            "SELECT service_price FROM tbl_services WHERE service_name = ?",
+                            (app_service,)
+                        ).fetchone()
+                        service_price = service_row['service_price'] if service_row else 50.00
+
+                        # Reuse the returning patient's record, else insert one (linked to customer if logged in)
+                        pat_id = find_existing_patient(g.db, name, age, contact, address, cid)
+                        if pat_id is None:
+                            cur = g.db.execute(
+                                "INSERT INTO tbl_patients (pat_name, pat_age, pat_sex, pat_contact, pat_address, customer_id) VALUES (?, ?, ?, ?, ?, ?)",
+                                (name, age, 'M', contact, address, cid)
+                            )
+                            g.db.commit()
+                            pat_id = cur.lastrowid
+
+                        if pat_id:
+                            # Insert appointment
+                            g.db.execute(
+                                "INSERT INTO tbl_appointments (pat_id, dentist_id, app_date, app_time, app_service, app_service_price, app_status, payment_status) VALUES (?, ?, ?, ?, ?, ?, 'Pending', 'Unpaid')",
+                                (pat_id, dentist_id, app_date, app_time, app_service, service_price)
+                            )
+                            g.db.commit()
+
+                            # Log and redirect
+                            app = g.db.execute(
+                                "SELECT app_id FROM tbl_appointments WHERE pat_id = ? ORDER BY app_id DESC LIMIT 1",
+                                (pat_id,)
+                            ).fetchone()
+
+                            log_action(cid, 'appointment_book', f"pat:{pat_id} dentist:{dentist_id} {app_date} {app_time}")
+                            session['pending_appointment'] = app['app_id']
+                            return redirect(url_for('appointment_payment'))
                 except Exception as e:
                     flash(f'Error booking appointment: {str(e)}', 'error')
 
@@ -259,6 +367,34 @@ def create_app():
         available = get_available_times(dentist_id, date)
         return jsonify(times=available)
 
+    @app.route('/api/earliest-slots')
+    def get_earliest_slots_api():
+        """Earliest open slots across every approved dentist offering a service"""
+        service = request.args.get('service', '').strip()
+        limit = max(1, min(request.args.get('limit', 5, type=int), 50))
+        days = max(1, min(request.args.get('days', 14, type=int), 90))
+        tomorrow = datetime.now().date() + timedelta(days=1)
+        try:
+            start = max(datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date(), tomorrow)
+        except ValueError:
+            start = tomorrow
+
+        svc = g.db.execute("SELECT service_specialty FROM tbl_services WHERE service_name = ?", (service,)).fetchone()
+        if not svc:
+            return jsonify(error='Unknown service', slots=[]), 404
+
+        # Dentists without a specialty offer every service, as in /api/services
+        dentists = g.db.execute(
+            "SELECT a.acc_id, a.acc_name FROM tbl_accounts a JOIN tbl_dentists d ON a.acc_id = d.dentist_id WHERE a.acc_role='Dentist' AND a.acc_status='Approved' AND (d.specialty = ? OR d.specialty IS NULL OR d.specialty = '')",
+            (svc['service_specialty'],)
+        ).fetchall()
+        names = {d['acc_id']: d['acc_name'] for d in dentists}
+        slots = earliest_slots(g.db, get_schedule(g.db), list(names), start, days, limit)
+        return jsonify(slots=[
+            {'dentist_id': did, 'dentist_name': names[did], 'app_date': d, 'app_time': t}
+            for d, t, did in slots
+        ])
+
     @app.route('/api/services/<int:dentist_id>')
     def get_services_by_dentist(dentist_id):
         dentist = g.db.execute("SELECT specialty FROM tbl_dentists WHERE dentist_id = ?", (dentist_id,)).fetchone()
@@ -338,6 +474,7 @@ def create_app():
                 if acc:
                     if role == 'Dentist':
                         g.db.execute("INSERT INTO tbl_dentists (dentist_id, specialty) VALUES (?, ?)", (acc['acc_id'], request.form.get('specialty','General Dentistry')))
+                        set_weekly_hours(g.db, acc['acc_id'], DEFAULT_HOURS)
                         g.db.commit()
                     elif role == 'Customer' and create_from_booking:
                         app_id = int(create_from_booking)
@@ -402,20 +539,30 @@ def create_app():
         for table in ['tbl_accounts','tbl_patients','tbl_dentists','tbl_appointments']:
             cur = g.db.execute(f"SELECT COUNT(*) as c FROM {table}")
             counts[table] = cur.fetchone()['c']
-        return render_template('dashboard_superadmin.html', counts=counts, user=current_user())
+        jobs = [job_progress(j) for j in g.db.execute("SELECT * FROM tbl_purge_jobs ORDER BY job_id DESC LIMIT 5")]
+        return render_template('dashboard_superadmin.html', counts=counts, jobs=jobs, user=current_user())
 
     @app.post('/super-admin/reset')
     @require_role(['Super Admin'])
     def super_admin_reset():
-        g.db.execute("DELETE FROM tbl_appointments")
-        g.db.execute("DELETE FROM tbl_dentists")
-        g.db.execute("DELETE FROM tbl_patients")
-        g.db.execute("DELETE FROM tbl_accounts WHERE acc_role != 'Super Admin'")
-        g.db.commit()
-        log_action(current_user(), 'reset_all', '')
-        flash('All data wiped except Super Admin.', 'success')
+        if active_job(g.db, 'reset'):
+            flash('A reset is already in progress.', 'error')
+            return redirect(url_for('super_admin_dashboard'))
+        user = current_user()
+        job_id = create_job(g.db, 'reset', created_by=user['acc_id'])
+        start_worker(DATABASE, [job_id])
+        log_action(user, 'reset_all', f"job:{job_id}")
+        flash('Reset started. All data except Super Admin is being wiped in the background.', 'success')
         return redirect(url_for('super_admin_dashboard'))
 
+    @app.route('/super-admin/purge/<int:job_id>')
+    @require_role(['Super Admin'])
+    def super_admin_purge_status(job_id):
+        job = g.db.execute("SELECT * FROM tbl_purge_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if not job:
+            return jsonify(error='Job not found'), 404
+        return jsonify(job_progress(job))
+
     @app.route('/super-admin/accounts')
     @require_role(['Super Admin'])
     def super_admin_accounts():
@@ -456,10 +603,14 @@ def create_app():
         if not role_row or role_row['acc_role'] == 'Super Admin':
             flash('Operation not allowed', 'error')
             return redirect(url_for('super_admin_accounts'))
-        g.db.execute("DELETE FROM tbl_accounts WHERE acc_id=?", (acc_id,))
-        g.db.commit()
-        log_action(current_user(), 'delete_account', str(acc_id))
-        flash('Account deleted', 'success')
+        booked = dentist_appointments(g.db, acc_id)
+        if booked:
+            flash(f'This dentist is on {booked} appointment(s) and cannot be deleted. Deactivate the account instead.', 'error')
+            return redirect(url_for('super_admin_accounts'))
+        job_id = create_job(g.db, 'account', acc_id, current_user()['acc_id'])
+        start_worker(DATABASE, [job_id])
+        log_action(current_user(), 'delete_account', f"{acc_id} job:{job_id}")
+        flash('Account deletion started', 'success')
         return redirect(url_for('super_admin_accounts'))
 
     @app.route('/super-admin/data')
@@ -517,6 +668,34 @@ def create_app():
         g.db.commit()
         return redirect(url_for('admin_dashboard'))
 
+    def report_range():
+        """Read ?start=&end= as ISO dates, defaulting to the last 30 days"""
+        today = datetime.now().date()
+        try:
+            end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d').date()
+        except ValueError:
+            end = today
+        try:
+            start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+        except ValueError:
+            start = end - timedelta(days=29)
+        if start > end:
+            start, end = end, start
+        return start.isoformat(), end.isoformat()
+
+    @app.route('/admin/reports')
+    @require_role(['Admin', 'Super Admin'])
+    def admin_reports():
+        start, end = report_range()
+        report = rollup_report(g.db, get_schedule(g.db), start, end)
+        return render_template('admin_reports.html', report=report, user=current_user())
+
+    @app.route('/api/admin/reports')
+    @require_role(['Admin', 'Super Admin'])
+    def admin_reports_api():
+        start, end = report_range()
+        return jsonify(rollup_report(g.db, get_schedule(g.db), start, end))
+
     # ---- Account Center ----
     @app.route('/account', methods=['GET','POST'])
     @require_role(['Super Admin','Admin','Staff','Dentist'])
@@ -568,8 +747,17 @@ def create_app():
     @app.route('/staff/patients')
     @require_role(['Staff'])
     def patients_list():
-        cur = g.db.execute("SELECT * FROM tbl_patients ORDER BY pat_name")
-        return render_template('patients_list.html', patients=cur.fetchall(), user=current_user())
+        q = request.args.get('q', '')
+        patients, next_cursor = search_patients(g.db, q, PAGE_SIZE, request.args.get('cursor'))
+        return render_template('patients_list.html', patients=patients, q=q, next_cursor=next_cursor, user=current_user())
+
+    @app.route('/api/patients/search')
+    @require_role(['Staff'])
+    def patients_search_api():
+        rows, next_cursor = search_patients(
+            g.db, request.args.get('q', ''), request.args.get('limit', PAGE_SIZE, type=int), request.args.get('cursor')
+        )
+        return jsonify(results=[dict(r) for r in rows], next=next_cursor)
 
     @app.route('/staff/patients/add', methods=['GET','POST'])
     @require_role(['Staff'])
@@ -611,8 +799,41 @@ def create_app():
     @app.route('/staff/dentists')
     @require_role(['Staff'])
     def dentist_schedules():
-        cur = g.db.execute("SELECT a.acc_id, a.acc_name, d.specialty, d.work_start, d.work_end, d.work_days FROM tbl_accounts a LEFT JOIN tbl_dentists d ON a.acc_id = d.dentist_id WHERE a.acc_role = 'Dentist' ORDER BY a.acc_name")
-        return render_template('dentists_schedules.html', dentists=cur.fetchall(), user=current_user(), is_staff_view=True)
+        cur = g.db.execute("SELECT a.acc_id, a.acc_name, d.specialty FROM tbl_accounts a LEFT JOIN tbl_dentists d ON a.acc_id = d.dentist_id WHERE a.acc_role = 'Dentist' ORDER BY a.acc_name")
+        dentists = cur.fetchall()
+        hours = {}
+        for r in g.db.execute("SELECT dentist_id, day_of_week, start_time, end_time FROM tbl_dentist_hours ORDER BY dentist_id, day_of_week, start_time"):
+            hours.setdefault(r['dentist_id'], [[] for _ in range(7)])[r['day_of_week']].append((r['start_time'], r['end_time']))
+        hours = {did: [format_intervals(day) for day in week] for did, week in hours.items()}
+        holidays = g.db.execute("SELECT holiday_date, holiday_name FROM tbl_holidays WHERE holiday_date >= date('now') ORDER BY holiday_date").fetchall()
+        return render_template('dentists_schedules.html', dentists=dentists, hours=hours, day_names=DAY_NAMES, holidays=holidays, user=current_user(), is_staff_view=True)
+
+    @app.post('/staff/holidays')
+    @require_role(['Staff'])
+    def holiday_add():
+        holiday_date = request.form.get('holiday_date','').strip()
+        holiday_name = request.form.get('holiday_name','').strip()
+        try:
+            datetime.strptime(holiday_date, '%Y-%m-%d')
+        except ValueError:
+            flash('Please enter a valid holiday date.', 'error')
+            return redirect(url_for('dentist_schedules'))
+        if not holiday_name:
+            flash('Holiday name is required.', 'error')
+            return redirect(url_for('dentist_schedules'))
+        g.db.execute("INSERT OR REPLACE INTO tbl_holidays (holiday_date, holiday_name) VALUES (?, ?)", (holiday_date, holiday_name))
+        g.db.commit()
+        log_action(current_user(), 'holiday_add', f"{holiday_date} {holiday_name}")
+        flash('Clinic holiday saved.', 'success')
+        return redirect(url_for('dentist_schedules'))
+
+    @app.post('/staff/holidays/<holiday_date>/delete')
+    @require_role(['Staff'])
+    def holiday_delete(holiday_date):
+        g.db.execute("DELETE FROM tbl_holidays WHERE holiday_date=?", (holiday_date,))
+        g.db.commit()
+        log_action(current_user(), 'holiday_delete', holiday_date)
+        return redirect(url_for('dentist_schedules'))
 
     @app.route('/dentist/schedule', methods=['GET','POST'])
     @require_role(['Dentist'])
@@ -620,20 +841,72 @@ def create_app():
         did = current_user()['acc_id']
         if request.method == 'POST':
             specialty = request.form.get('specialty','')
-            work_start = request.form.get('work_start','08:00')
-            work_end = request.form.get('work_end','17:00')
-            work_days = request.form.get('work_days','Monday,Tuesday,Wednesday,Thursday,Friday')
+            hours = []
+            try:
+                for day, day_name in enumerate(DAY_NAMES):
+                    for start, end in parse_intervals(request.form.get(f'hours_{day}', '')):
+                        hours.append((day, start, end))
+            except ValueError:
+                flash(f'Invalid hours for {day_name}. Use ranges like 09:00-12:00, 13:00-17:00.', 'error')
+                return redirect(url_for('dentist_schedule_edit'))
             cur = g.db.execute("SELECT 1 FROM tbl_dentists WHERE dentist_id=?", (did,)).fetchone()
             if cur:
-                g.db.execute("UPDATE tbl_dentists SET specialty=?, work_start=?, work_end=?, work_days=? WHERE dentist_id=?", (specialty, work_start, work_end, work_days, did))
+                g.db.execute("UPDATE tbl_dentists SET specialty=? WHERE dentist_id=?", (specialty, did))
             else:
-                g.db.execute("INSERT INTO tbl_dentists (dentist_id, specialty, work_start, work_end, work_days) VALUES (?, ?, ?, ?, ?)", (did, specialty, work_start, work_end, work_days))
+                g.db.execute("INSERT INTO tbl_dentists (dentist_id, specialty) VALUES (?, ?)", (did, specialty))
+            set_weekly_hours(g.db, did, hours)
             g.db.commit()
             log_action(current_user(), 'own_schedule_update', str(did))
             flash('Your duty schedule has been updated successfully.', 'success')
             return redirect(url_for('dentist_dashboard'))
         cur = g.db.execute("SELECT a.acc_id, a.acc_name, d.* FROM tbl_accounts a LEFT JOIN tbl_dentists d ON a.acc_id = d.dentist_id WHERE a.acc_id=?", (did,))
-        return render_template('dentist_schedule_form.html', dentist=cur.fetchone(), is_self=True, user=current_user())
+        week = [format_intervals(day) for day in weekly_hours(g.db, did)]
+        exceptions = g.db.execute(
+            "SELECT * FROM tbl_dentist_exceptions WHERE dentist_id=? AND exc_date >= date('now') ORDER BY exc_date, start_time",
+            (did,)
+        ).fetchall()
+        return render_template('dentist_schedule_form.html', dentist=cur.fetchone(), week=week, day_names=DAY_NAMES, exceptions=exceptions, is_self=True, user=current_user())
+
+    @app.post('/dentist/schedule/exceptions')
+    @require_role(['Dentist'])
+    def dentist_exception_add():
+        did = current_user()['acc_id']
+        exc_date = request.form.get('exc_date','').strip()
+        start_time = request.form.get('start_time','').strip() or None
+        end_time = request.form.get('end_time','').strip() or None
+        is_available = 1 if request.form.get('is_available') == '1' else 0
+        reason = request.form.get('reason','').strip()
+        try:
+            datetime.strptime(exc_date, '%Y-%m-%d')
+            if bool(start_time) != bool(end_time) or (start_time and to_minutes(start_time) >= to_minutes(end_time)):
+                raise ValueError(exc_date)
+            if is_available and not start_time:
+                raise ValueError(exc_date)
+            if start_time:
+                start_time, end_time = normalize_time(start_time), normalize_time(end_time)
+        except ValueError:
+            flash('Please enter a valid date and time range for the exception.', 'error')
+            return redirect(url_for('dentist_schedule_edit'))
+        if not g.db.execute("SELECT 1 FROM tbl_dentists WHERE dentist_id=?", (did,)).fetchone():
+            flash('Save your duty schedule before adding exceptions.', 'error')
+            return redirect(url_for('dentist_schedule_edit'))
+        g.db.execute(
+            "INSERT INTO tbl_dentist_exceptions (dentist_id, exc_date, start_time, end_time, is_available, reason) VALUES (?, ?, ?, ?, ?, ?)",
+            (did, exc_date, start_time, end_time, is_available, reason)
+        )
+        g.db.commit()
+        log_action(current_user(), 'schedule_exception_add', f"{did} {exc_date}")
+        flash('Schedule exception saved.', 'success')
+        return redirect(url_for('dentist_schedule_edit'))
+
+    @app.post('/dentist/schedule/exceptions/<int:exc_id>/delete')
+    @require_role(['Dentist'])
+    def dentist_exception_delete(exc_id):
+        did = current_user()['acc_id']
+        g.db.execute("DELETE FROM tbl_dentist_exceptions WHERE exc_id=? AND dentist_id=?", (exc_id, did))
+        g.db.commit()
+        log_action(current_user(), 'schedule_exception_delete', str(exc_id))
+        return redirect(url_for('dentist_schedule_edit'))
 
     # Appointments
     @app.route('/staff/appointments')
@@ -652,23 +925,14 @@ def create_app():
             app_time_str = request.form.get('app_time')
             app_service = request.form.get('app_service','Dental Checkup')
 
-            # Validate dentist working day and time
-            den = g.db.execute("SELECT work_start, work_end, work_days FROM tbl_dentists WHERE dentist_id=?", (did,)).fetchone()
-            if not den:
-                flash('Dentist schedule not set', 'error')
+            if not pid or not g.db.execute("SELECT 1 FROM tbl_patients WHERE pat_id=?", (pid,)).fetchone():
+                flash('Please select a patient.', 'error')
                 return redirect(url_for('appointment_schedule'))
 
-            day_of_week = datetime.strptime(app_date, '%Y-%m-%d').strftime('%A')
-            if day_of_week not in (den['work_days'] or ''):
-                flash(f'Dentist does not work on {day_of_week}', 'error')
-                return redirect(url_for('appointment_schedule'))
-
-            # Check if appointment time is within dentist's working hours
-            app_time_obj = datetime.strptime(app_time_str, '%H:%M')
-            work_start_obj = datetime.strptime(den['work_start'], '%H:%M')
-            work_end_obj = datetime.strptime(den['work_end'], '%H:%M')
-            if not (work_start_obj <= app_time_obj < work_end_obj):
-                flash(f"Appointment time must be between {den['work_start']} and {den['work_end']}", 'error')
+            # Validate dentist working day and time
+            schedule_error = check_dentist_schedule(did, app_date or '', app_time_str or '')
+            if schedule_error:
+                flash(schedule_error, 'error')
                 return redirect(url_for('appointment_schedule'))
 
             # Check conflicts
@@ -690,10 +954,9 @@ def create_app():
             flash('Appointment scheduled and sent to dentist.', 'success')
             return redirect(url_for('appointments_list'))
 
-        patients = g.db.execute("SELECT pat_id, pat_name FROM tbl_patients ORDER BY pat_name").fetchall()
         dentists = g.db.execute("SELECT a.acc_id, a.acc_name FROM tbl_accounts a WHERE a.acc_role='Dentist' AND a.acc_status='Approved' ORDER BY a.acc_name").fetchall()
         services = g.db.execute("SELECT service_name, service_price FROM tbl_services ORDER BY service_name").fetchall()
-        return render_template('appointment_schedule.html', patients=patients, dentists=dentists, services=services, user=current_user())
+        return render_template('appointment_schedule.html', dentists=dentists, services=services, user=current_user())
 
     @app.post('/staff/appointments/<int:aid>/cancel')
     @require_role(['Staff'])
@@ -0,0 +1,442 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import time
+from datetime import datetime, timezone
+
+PAGES_PER_STEP = 1024
+STEP_PAUSE = 0.005
+KEEP = 7
+COMPRESS_LEVEL = 3
+SHIP_INTERVAL = 1.0
+CHECKPOINT_FRAMES = 1000
+SEGMENT_BYTES = 64 << 20
+
+# With shipping on, only the shipper may checkpoint, so no WAL frame is folded
+# into the database file (and lost to the stream) before it has been copied.
+WAL_SHIPPING = os.environ.get('DENTALCARE_WAL_SHIPPING') == '1'
+
+_WAL_HEADER = 32
+_FRAME_HEADER = 24
+_CHUNK = 1 << 20
+
+
+def configure_connection(db):
+    if WAL_SHIPPING:
+        db.execute("PRAGMA wal_autocheckpoint=0")
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _stamp(moment):
+    return moment.strftime('%Y%m%dT%H%M%S%fZ')
+
+
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _compress(src, dest):
+    """gzip src into dest; returns the sha256 of the uncompressed bytes"""
+    digest = hashlib.sha256()
+    with open(src, 'rb') as f, gzip.open(dest, 'wb', compresslevel=COMPRESS_LEVEL) as out:
+        while chunk := f.read(_CHUNK):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def _decompress(src, dest):
+    digest = hashlib.sha256()
+    with gzip.open(src, 'rb') as f, open(dest, 'wb') as out:
+        while chunk := f.read(_CHUNK):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def _remove_gradually(path, step=256 << 20, pause=0.05):
+    """Delete a large scratch file by shrinking it in steps; freeing gigabytes in
+    one unlink can stall the filesystem journal that app commits fsync through"""
+    size = os.path.getsize(path)
+    with open(path, 'r+b') as f:
+        while size > step:
+            size -= step
+            f.truncate(size)
+            time.sleep(pause)
+    os.remove(path)
+
+
+def _copy_pages(database, dest, pages, pause):
+    """Copy a consistent image of `database` into the file `dest` with the online backup API.
+
+    In WAL mode a read transaction is held across steps: it pins one snapshot,
+    so concurrent commits never force the copy to restart, and WAL readers do
+    not block writers. In rollback-journal mode the lock is released between
+    steps instead, since a held shared lock would stall every writer.
+    """
+    src = sqlite3.connect(database, timeout=30, isolation_level=None)
+    dst = sqlite3.connect(dest)
+    # The copy is a scratch file that is checked and hashed afterwards, so it
+    # needs no journal or fsyncs; skipping them keeps the copy from flooding
+    # the disk queue the app's WAL commits are waiting on
+    dst.execute("PRAGMA journal_mode=OFF")
+    dst.execute("PRAGMA synchronous=OFF")
+    try:
+        wal = src.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        if wal:
+            src.execute("BEGIN")
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=pages, sleep=pause)
+        page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+        page_count = dst.execute("PRAGMA page_count").fetchone()[0]
+        check = dst.execute("PRAGMA quick_check").fetchone()[0]
+        if wal:
+            src.execute("COMMIT")
+    finally:
+        dst.close()
+        src.close()
+    if check != 'ok':
+        raise sqlite3.DatabaseError(f'backup copy failed quick_check: {check}')
+    return page_size, page_count
+
+
+def create_snapshot(database, backup_dir, pages=PAGES_PER_STEP, pause=STEP_PAUSE, keep=KEEP):
+    """Write a compressed, checksummed snapshot generation and rotate old ones. Returns its manifest.
+
+    The generation is assembled under a temporary name and renamed into place
+    last, so an interrupted backup never leaves a half-written snapshot behind.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    started = _now()
+    gen = _stamp(started)
+    work = os.path.join(backup_dir, f'.tmp-{gen}')
+    os.makedirs(work)
+    try:
+        raw = os.path.join(work, 'snapshot.db')
+        t0 = time.perf_counter()
+        page_size, page_count = _copy_pages(database, raw, pages, pause)
+        copy_seconds = time.perf_counter() - t0
+        size = os.path.getsize(raw)
+        sha256 = _compress(raw, os.path.join(work, 'snapshot.db.gz'))
+        _remove_gradually(raw)
+        manifest = {
+            'generation': gen,
+            'created_at': started.isoformat(),
+            'source': os.path.abspath(database),
+            'page_size': page_size,
+            'page_count': page_count,
+            'size': size,
+            'compressed_size': os.path.getsize(os.path.join(work, 'snapshot.db.gz')),
+            'sha256': sha256,
+            'copy_seconds': round(copy_seconds, 3),
+            'total_seconds': round(time.perf_counter() - t0, 3),
+            'segments': [],
+        }
+        _write_json(os.path.join(work, 'manifest.json'), manifest)
+        os.replace(work, os.path.join(backup_dir, gen))
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    rotate(backup_dir, keep)
+    return manifest
+
+
+def list_generations(backup_dir):
+    """Manifests of complete generations, oldest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(backup_dir)):
+        path = os.path.join(backup_dir, name, 'manifest.json')
+        if not name.startswith('.') and os.path.isfile(path):
+            with open(path) as f:
+                manifests.append(json.load(f))
+    return manifests
+
+
+def rotate(backup_dir, keep=KEEP, shipped=False):
+    """Delete all but the newest `keep` plain snapshots, or WAL-shipped generations when `shipped`.
+
+    The two are rotated separately so scheduled snapshots never prune the
+    generation a running shipper is writing to. keep <= 0 keeps everything.
+    """
+    generations = [m for m in list_generations(backup_dir) if bool(m['segments']) == shipped]
+    removed = []
+    for m in generations[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(backup_dir, m['generation']), ignore_errors=True)
+        removed.append(m['generation'])
+    return removed
+
+
+def _apply_frames(f, data, page_size, pending):
+    """Checkpoint WAL frames into an open database file, one committed transaction at a time"""
+    frame_size = _FRAME_HEADER + page_size
+    for off in range(0, len(data) - frame_size + 1, frame_size):
+        pgno, commit = struct.unpack_from('>II', data, off)
+        pending[pgno] = data[off + _FRAME_HEADER:off + frame_size]
+        if commit:
+            for pgno, page in sorted(pending.items()):
+                f.seek((pgno - 1) * page_size)
+                f.write(page)
+            f.truncate(commit * page_size)
+            pending.clear()
+
+
+def _replay(backup_dir, manifest, path, until=None):
+    """Apply the generation's shipped WAL segments to the snapshot at `path`, stopping after `until`"""
+    applied = 0
+    pending = {}
+    with open(path, 'r+b') as f:
+        for seg in manifest['segments']:
+            # Base segments bring the snapshot up to a consistent point, so they always apply
+            if until and not seg.get('base') and datetime.fromisoformat(seg['shipped_at']) > until:
+                break
+            with gzip.open(os.path.join(backup_dir, manifest['generation'], seg['file']), 'rb') as s:
+                data = s.read()
+            if hashlib.sha256(data).hexdigest() != seg['sha256']:
+                raise ValueError(f"segment {seg['file']} checksum mismatch")
+            _apply_frames(f, data, manifest['page_size'], pending)
+            applied += 1
+    return applied
+
+
+def _materialize(backup_dir, manifest, path, until=None):
+    sha256 = _decompress(os.path.join(backup_dir, manifest['generation'], 'snapshot.db.gz'), path)
+    if sha256 != manifest['sha256']:
+        raise ValueError(f"snapshot {manifest['generation']} checksum mismatch")
+    return _replay(backup_dir, manifest, path, until)
+
+
+def verify_generation(backup_dir, manifest):
+    """Rebuild a generation in a scratch file and integrity-check it. Returns (ok, message)."""
+    with tempfile.TemporaryDirectory(dir=backup_dir) as scratch:
+        path = os.path.join(scratch, 'verify.db')
+        try:
+            applied = _materialize(backup_dir, manifest, path)
+            db = sqlite3.connect(path)
+            try:
+                result = db.execute("PRAGMA integrity_check").fetchone()[0]
+            finally:
+                db.close()
+        except (OSError, ValueError, sqlite3.DatabaseError) as e:
+            return False, str(e)
+    if result != 'ok':
+        return False, f'integrity_check: {result}'
+    return True, f'{applied} WAL segments applied'
+
+
+def restore_generation(backup_dir, manifest, target, until=None):
+    """Restore a generation to `target`, replaying WAL segments shipped up to `until` (aware datetime) when given"""
+    work = target + '.restoring'
+    try:
+        applied = _materialize(backup_dir, manifest, work, until)
+        db = sqlite3.connect(work)
+        try:
+            result = db.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            db.close()
+        if result != 'ok':
+            raise ValueError(f'restored database failed integrity_check: {result}')
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(target + suffix):
+                os.remove(target + suffix)
+        os.replace(work, target)
+    finally:
+        if os.path.exists(work):
+            os.remove(work)
+    return applied
+
+
+class WalShipper:
+    """Continuously copy committed WAL frames into the current generation for point-in-time recovery.
+
+    Frames are read straight from the -wal file, checked against the header
+    salts and the running checksum, and shipped up to the last commit frame.
+    The shipper runs its own checkpoints and remembers how many frames each
+    full backfill covered; a WAL restart is only accepted as a continuation
+    when all of those frames had been shipped. Any other restart leaves a
+    gap, and a fresh generation is started instead.
+    """
+
+    def __init__(self, database, backup_dir, keep=KEEP, checkpoint_frames=CHECKPOINT_FRAMES, log=print):
+        self.database = database
+        self.wal_path = database + '-wal'
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.checkpoint_frames = checkpoint_frames
+        self.log = log
+        # Held open for the shipper's lifetime so the last app connection closing never checkpoints
+        self.db = sqlite3.connect(database, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA wal_autocheckpoint=0")
+        self.reader = sqlite3.connect(database, timeout=30, isolation_level=None, check_same_thread=False)
+        self.manifest = None
+        self.header = None
+
+    def close(self):
+        self.reader.close()
+        self.db.close()
+
+    def _read_header(self):
+        try:
+            with open(self.wal_path, 'rb') as f:
+                header = f.read(_WAL_HEADER)
+        except FileNotFoundError:
+            return None
+        if len(header) < _WAL_HEADER:
+            return None
+        magic, _, page_size, _, salt1, salt2, c1, c2 = struct.unpack('>8I', header)
+        if magic not in (0x377f0682, 0x377f0683):
+            return None
+        order = '<' if magic == 0x377f0682 else '>'
+        if _checksum(header[:24], 0, 0, order) != (c1, c2):
+            return None
+        return {'page_size': page_size, 'salts': (salt1, salt2), 'cksum': (c1, c2), 'order': order}
+
+    def _begin_wal(self, header):
+        self.header = header
+        self.offset = _WAL_HEADER
+        self.frame = 0
+        self.backfilled = None
+        self.cksum = header['cksum'] if header else None
+
+    def start_generation(self):
+        # The WAL must not restart between the snapshot and the first shipment,
+        # otherwise frames committed in between would be missing from both.
+        before = self._read_header()
+        self.manifest = create_snapshot(self.database, self.backup_dir, keep=self.keep)
+        after = self._read_header()
+        if before and (not after or after['salts'] != before['salts']):
+            self.log('WAL restarted during the snapshot; starting over')
+            return self.start_generation()
+        # Replaying the whole current WAL on top of the snapshot is safe: every
+        # frame the snapshot already contains is rewritten with the same page.
+        self.wal = 0
+        self._begin_wal(after)
+        self.ship()
+        for seg in self.manifest['segments']:
+            seg['base'] = True
+        _write_json(os.path.join(self.backup_dir, self.manifest['generation'], 'manifest.json'), self.manifest)
+        rotate(self.backup_dir, self.keep, shipped=True)
+        self.log(f"new generation {self.manifest['generation']}")
+
+    def ship(self):
+        """Ship newly committed frames; returns the number of frames shipped"""
+        header = self._read_header()
+        if header is None:
+            return 0
+        if self.header is None or header['salts'] != self.header['salts']:
+            # A restart bumps salt-1 by one; one we did not see would skip a value
+            continued = self.header is None or (
+                header['salts'][0] == (self.header['salts'][0] + 1) & 0xFFFFFFFF
+                and self.backfilled is not None and self.frame >= self.backfilled
+            )
+            if not continued:
+                self.log('WAL restarted with unshipped frames (is DENTALCARE_WAL_SHIPPING=1 set for the app?)')
+                self.start_generation()
+                return 0
+            if self.header:
+                self.wal += 1
+            self._begin_wal(header)
+        page_size, order = header['page_size'], header['order']
+        frame_size = _FRAME_HEADER + page_size
+        shipped = bytearray()
+        s1, s2 = self.cksum
+        frames = commit_frames = commit_len = 0
+        cksum = self.cksum
+        with open(self.wal_path, 'rb') as f:
+            f.seek(self.offset)
+            while True:
+                frame = f.read(frame_size)
+                if len(frame) < frame_size:
+                    break
+                pgno, commit, salt1, salt2, c1, c2 = struct.unpack_from('>6I', frame)
+                if (salt1, salt2) != header['salts']:
+                    break
+                s1, s2 = _checksum(frame[:8], s1, s2, order)
+                s1, s2 = _checksum(frame[_FRAME_HEADER:], s1, s2, order)
+                if (s1, s2) != (c1, c2):
+                    break
+                shipped += frame
+                frames += 1
+                if commit:
+                    commit_frames, commit_len, cksum = frames, len(shipped), (s1, s2)
+                    if commit_len >= SEGMENT_BYTES:
+                        break
+        if not commit_frames:
+            return 0
+        data = bytes(shipped[:commit_len])
+        gen_dir = os.path.join(self.backup_dir, self.manifest['generation'])
+        name = f"wal/{len(self.manifest['segments']) + 1:08d}.gz"
+        os.makedirs(os.path.join(gen_dir, 'wal'), exist_ok=True)
+        with gzip.open(os.path.join(gen_dir, name), 'wb', compresslevel=COMPRESS_LEVEL) as out:
+            out.write(data)
+        self.manifest['segments'].append({
+            'file': name,
+            'wal': self.wal,
+            'first_frame': self.frame + 1,
+            'frames': commit_frames,
+            'shipped_at': _now().isoformat(),
+            'sha256': hashlib.sha256(data).hexdigest(),
+        })
+        _write_json(os.path.join(gen_dir, 'manifest.json'), self.manifest)
+        self.offset += commit_len
+        self.frame += commit_frames
+        self.cksum = cksum
+        if commit_len >= SEGMENT_BYTES:
+            return commit_frames + self.ship()
+        return commit_frames
+
+    def checkpoint(self):
+        """Fold shipped frames back into the database, holding the write lock only for the tail.
+
+        The bulk of the backfill runs under a pinned read transaction, which
+        keeps writers from restarting the WAL but not from committing. The
+        write lock is then taken just long enough to ship and backfill the
+        frames committed meanwhile, so the WAL is never restarted over
+        frames that have not been shipped.
+        """
+        self.ship()
+        self.reader.execute("BEGIN")
+        try:
+            self.reader.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            self.db.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            self.ship()
+            self.db.execute("BEGIN IMMEDIATE")
+        finally:
+            self.reader.execute("COMMIT")
+        try:
+            self.ship()
+            busy, log, done = self.reader.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            if not busy and log > 0 and log == done:
+                self.backfilled = log
+        finally:
+            self.db.execute("ROLLBACK")
+
+    def run(self, interval=SHIP_INTERVAL, stop=None):
+        self.start_generation()
+        while not (stop and stop()):
+            self.ship()
+            if self.header and self.frame - (self.backfilled or 0) >= self.checkpoint_frames:
+                self.checkpoint()
+            time.sleep(interval)
+
+
+def _checksum(data, s1, s2, order):
+    """SQLite's WAL checksum over `data`, continuing from (s1, s2)"""
+    words = struct.unpack(f'{order}{len(data) // 4}I', data)
+    for i in range(0, len(words), 2):
+        s1 = (s1 + words[i] + s2) & 0xFFFFFFFF
+        s2 = (s2 + words[i + 1] + s1) & 0xFFFFFFFF
+    return s1, s2
@@ -0,0 +1,153 @@
+"""Benchmark online snapshots and WAL shipping against a multi-GB seed under request load.
+
+Run from the repository root:
+
+    python benchmarks/bench_backup.py [size_gb]
+
+Seeds a temporary WAL-mode database from schema.sql with appointments
+carrying long notes until it reaches size_gb, then runs a load process that
+mimics app requests (a fresh connection per request, an availability read,
+and a booking insert on every fourth request). Request latency is measured
+with no backup running, during create_snapshot, and while the WAL shipper
+runs its ship/checkpoint cycle.
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ['DENTALCARE_WAL_SHIPPING'] = '1'
+
+from backup import WalShipper, configure_connection, create_snapshot, verify_generation  # noqa: E402
+
+BATCH = 50_000
+PHASE_SECONDS = 15
+DENTISTS = 20
+PATIENTS = 1000
+
+
+def seed(path, size_gb):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    with open(os.path.join(os.path.dirname(__file__), '..', 'schema.sql'), encoding='utf-8') as f:
+        db.executescript(f.read())
+    db.executemany("INSERT INTO tbl_accounts (acc_name, acc_email, acc_pass, acc_role, acc_status) VALUES (?, ?, 'x', 'Dentist', 'Approved')",
+                   [(f'Dentist {i}', f'd{i}@example.com') for i in range(DENTISTS)])
+    db.executemany("INSERT INTO tbl_patients (pat_name, pat_age, pat_sex) VALUES (?, 30, 'F')", [(f'Patient {i}',) for i in range(PATIENTS)])
+    db.commit()
+    target = size_gb * 2**30
+    while os.path.getsize(path) + os.path.getsize(path + '-wal') < target:
+        # Notes are half random hex, half repeated text, so the snapshot compresses about as well as real notes
+        db.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) "
+            "INSERT INTO tbl_appointments (pat_id, dentist_id, app_date, app_time, app_service, app_status, app_notes) "
+            "SELECT abs(random()) % ? + 1, abs(random()) % ? + 1, date('2020-01-01', '+' || (abs(random()) % 2500) || ' days'), "
+            "printf('%02d:%02d', 9 + abs(random()) % 7, (abs(random()) % 2) * 30), 'Cleaning', 'Completed', "
+            "hex(randomblob(250)) || printf('%.500c', 'x') FROM n",
+            (BATCH, PATIENTS, DENTISTS)
+        )
+        db.commit()
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db.close()
+
+
+def load(path, stop, out):
+    rng = random.Random(os.getpid())
+    latencies = []
+    i = 0
+    while not stop.is_set():
+        day = f'2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}'
+        dentist = rng.randint(1, DENTISTS)
+        t0 = time.perf_counter()
+        db = sqlite3.connect(path, timeout=30)
+        configure_connection(db)
+        db.execute("SELECT app_time FROM tbl_appointments WHERE app_date = ? AND dentist_id = ? AND app_status != 'Cancelled'",
+                   (day, dentist)).fetchall()
+        if i % 4 == 0:
+            db.execute("INSERT INTO tbl_appointments (pat_id, dentist_id, app_date, app_time, app_service) VALUES (1, ?, ?, '10:00', 'Cleaning')",
+                       (dentist, day))
+            db.commit()
+        db.close()
+        latencies.append(time.perf_counter() - t0)
+        i += 1
+        time.sleep(0.005)
+    out.put(latencies)
+
+
+def measure(path, work):
+    """Run the load while `work` runs; returns (latencies, work result)"""
+    out = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    proc = multiprocessing.Process(target=load, args=(path, stop, out))
+    proc.start()
+    time.sleep(1)
+    result = work()
+    stop.set()
+    latencies = out.get()
+    proc.join()
+    return latencies, result
+
+
+def report(label, latencies):
+    values = sorted(latencies)
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p))] * 1000  # noqa: E731
+    print(f'{label:<22} {len(values):>6} requests  p50 {pick(0.5):6.2f} ms  p99 {pick(0.99):7.2f} ms  max {values[-1] * 1000:7.2f} ms')
+
+
+def main():
+    size_gb = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'bench.db')
+        backups = os.path.join(tmp, 'backups')
+        t0 = time.perf_counter()
+        seed(path, size_gb)
+        print(f'seeded {os.path.getsize(path) / 2**30:.2f} GiB in {time.perf_counter() - t0:.0f} s')
+        # Stands in for the app's other workers: with at least one connection open,
+        # closing a request's connection never triggers the last-close checkpoint
+        keeper = sqlite3.connect(path)
+        configure_connection(keeper)
+
+        latencies, _ = measure(path, lambda: time.sleep(PHASE_SECONDS))
+        report('no backup', latencies)
+
+        latencies, manifest = measure(path, lambda: create_snapshot(path, backups))
+        report('during snapshot', latencies)
+        print(f"snapshot: copy {manifest['copy_seconds']} s, total {manifest['total_seconds']} s, "
+              f"{manifest['size'] / 2**30:.2f} GiB -> {manifest['compressed_size'] / 2**30:.2f} GiB")
+
+        shipper = WalShipper(path, backups, checkpoint_frames=200, log=lambda message: None)
+        shipper.start_generation()
+
+        def ship():
+            # Same loop as WalShipper.run, minus the initial snapshot measured above
+            end = time.perf_counter() + PHASE_SECONDS
+            while time.perf_counter() < end:
+                shipper.ship()
+                if shipper.frame - (shipper.backfilled or 0) >= shipper.checkpoint_frames:
+                    shipper.checkpoint()
+                time.sleep(0.5)
+            return shipper.manifest
+
+        latencies, manifest = measure(path, ship)
+        shipper.close()
+        report('during WAL shipping', latencies)
+        restarts = manifest['segments'][-1]['wal'] if manifest['segments'] else 0
+        print(f"shipping: {len(manifest['segments'])} segments, {sum(s['frames'] for s in manifest['segments'])} frames, "
+              f"{restarts} WAL restarts")
+
+        t0 = time.perf_counter()
+        ok, message = verify_generation(backups, manifest)
+        print(f"verify: {'OK' if ok else 'FAILED'} ({message}) in {time.perf_counter() - t0:.0f} s")
+        keeper.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark the earliest-slot search: 200 dentists over a 60-day horizon.
+
+Run from the repository root:
+
+    python benchmarks/bench_earliest_slots.py
+
+Seeds an in-memory database from schema.sql, books most of the clinic grid so
+the search has to look deep into the window, then compares the k-way merge in
+schedule.earliest_slots with polling /api/available-times style lookups one
+dentist and one day at a time. The "service" runs search only the first
+SERVICE_DENTISTS dentists, as /api/earliest-slots does for a specialty.
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from schedule import (  # noqa: E402
+    CLINIC_SLOTS, compile_schedule, earliest_slots, mask_times, set_weekly_hours, slot_of,
+)
+
+DENTISTS = 200
+DAYS = 60
+BOOKED_RATIO = 0.97
+FULL_UNTIL_DAY = 40  # every grid slot is taken before this day in the "deep" run
+LIMIT = 5
+SERVICE_DENTISTS = 20
+ROUNDS = 20
+
+
+def seed(full_until_day):
+    db = sqlite3.connect(':memory:')
+    with open(os.path.join(os.path.dirname(__file__), '..', 'schema.sql'), encoding='utf-8') as f:
+        db.executescript(f.read())
+    rng = random.Random(26)
+    start = date.today() + timedelta(days=1)
+    grid = mask_times(CLINIC_SLOTS)
+    db.execute("INSERT INTO tbl_patients (pat_name, pat_age) VALUES ('Bench Patient', 30)")
+    for did in range(1, DENTISTS + 1):
+        db.execute("INSERT INTO tbl_accounts (acc_id, acc_name, acc_email, acc_pass, acc_role, acc_status) VALUES (?, ?, ?, 'x', 'Dentist', 'Approved')",
+                   (did, f'Dentist {did}', f'd{did}@bench'))
+        db.execute("INSERT INTO tbl_dentists (dentist_id, specialty) VALUES (?, 'General Dentistry')", (did,))
+        days = rng.sample(range(7), rng.randint(3, 6))
+        set_weekly_hours(db, did, [(d, '09:00', '12:00') for d in days] + [(d, '13:00', '17:00') for d in days])
+    rows = []
+    for did in range(1, DENTISTS + 1):
+        for i in range(DAYS):
+            app_date = (start + timedelta(days=i)).isoformat()
+            for t in grid:
+                if i < full_until_day or rng.random() < BOOKED_RATIO:
+                    rows.append((1, did, app_date, t))
+    db.executemany("INSERT INTO tbl_appointments (pat_id, dentist_id, app_date, app_time, app_status) VALUES (?, ?, ?, ?, 'Scheduled')", rows)
+    db.commit()
+    return db, start, len(rows)
+
+
+def day_by_day(db, compiled, dentist_ids, start, limit):
+    """Baseline: the old client flow of asking for one dentist's day at a time"""
+    found = []
+    for i in range(DAYS):
+        app_date = (start + timedelta(days=i)).isoformat()
+        for did in dentist_ids:
+            mask = compiled.day_mask(did, app_date) & CLINIC_SLOTS
+            for r in db.execute("SELECT app_time FROM tbl_appointments WHERE dentist_id=? AND app_date=? AND app_status IN ('Approved', 'Scheduled')", (did, app_date)):
+                mask &= ~(1 << slot_of(r[0]))
+            found.extend((app_date, t, did) for t in mask_times(mask))
+        if len(found) >= limit:
+            return sorted(found)[:limit]
+    return sorted(found)[:limit]
+
+
+def timed(fn):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def run(label, full_until_day, dentists=DENTISTS):
+    db, start, bookings = seed(full_until_day)
+    compiled = compile_schedule(db)
+    dentist_ids = list(range(1, dentists + 1))
+    t_merge, r_merge = timed(lambda: earliest_slots(db, compiled, dentist_ids, start, DAYS, LIMIT))
+    t_scan, r_scan = timed(lambda: day_by_day(db, compiled, dentist_ids, start, LIMIT))
+    assert r_merge == r_scan, (r_merge, r_scan)
+    print(f'[{label}] {dentists} of {DENTISTS} dentists, {DAYS} days, {bookings} bookings, first slot {r_merge[0] if r_merge else None}')
+    print(f'  k-way merge:        {t_merge * 1000:8.2f} ms')
+    print(f'  day-by-day polling: {t_scan * 1000:8.2f} ms')
+
+
+def main():
+    run('shallow', 0)
+    run('deep', FULL_UNTIL_DAY)
+    run('deep service', FULL_UNTIL_DAY, SERVICE_DENTISTS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark patient typeahead search on a 1M-patient seed.
+
+Run from the repository root:
+
+    python benchmarks/bench_patient_search.py [patients]
+
+Seeds a temporary database from schema.sql (the FTS triggers index every
+insert), then times search_patients for a mix of name prefixes, partial
+phone numbers, address fragments and keyset continuations.
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from patient_search import search_patients  # noqa: E402
+
+FIRST = ['Maria', 'Jose', 'Juan', 'Ana', 'Mark', 'John', 'Angel', 'Michael', 'Kristine', 'Paolo', 'Liza', 'Ramon',
+         'Carmela', 'Bea', 'Nico', 'Grace', 'Allan', 'Joy', 'Ricardo', 'Teresa']
+LAST = ['Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Villanueva', 'Ramos',
+        'Aquino', 'Castillo', 'Rivera', 'Navarro', 'Dela Cruz', 'Gonzales', 'Lopez', 'Aguilar', 'Pascual', 'Soriano']
+CITIES = ['Quezon City', 'Manila', 'Cebu City', 'Davao City', 'Makati', 'Pasig', 'Taguig', 'Iloilo City', 'Baguio']
+STREETS = ['Rizal St', 'Mabini Ave', 'Bonifacio St', 'Luna St', 'Del Pilar St', 'Burgos Ave', 'Quezon Blvd']
+QUERIES = 2000
+
+
+def seed(db, n, rng):
+    def rows():
+        for _ in range(n):
+            name = f'{rng.choice(FIRST)} {rng.choice(LAST)}{rng.randint(1, 999):03d}'
+            contact = f'(+63)9{rng.randint(10, 99)} {rng.randint(100, 999)}-{rng.randint(1000, 9999)}'
+            address = f'{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}'
+            yield name, rng.randint(1, 90), rng.choice('MF'), contact, address
+    db.executemany("INSERT INTO tbl_patients (pat_name, pat_age, pat_sex, pat_contact, pat_address) VALUES (?, ?, ?, ?, ?)", rows())
+    db.commit()
+
+
+def queries(db, rng):
+    sample = db.execute("SELECT pat_name, pat_contact, pat_address FROM tbl_patients ORDER BY random() LIMIT 500").fetchall()
+    out = []
+    for _ in range(QUERIES):
+        name, contact, address = rng.choice(sample)
+        kind = rng.randrange(5)
+        if kind == 0:
+            out.append(name[:rng.randint(1, 3)])                   # short prefix
+        elif kind == 1:
+            out.append(name[:rng.randint(4, len(name))])           # longer prefix
+        elif kind == 2:
+            digits = ''.join(c for c in contact if c.isdigit())
+            start = rng.randint(0, len(digits) - 5)
+            out.append(digits[start:start + rng.randint(4, 7)])    # partial phone number
+        elif kind == 3:
+            out.append(address.split(', ')[0].split(' ', 1)[1][:rng.randint(4, 8)])  # street fragment
+        else:
+            out.append(name.split(' ')[1][:rng.randint(3, 6)])    # surname fragment
+    return out
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(29)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        db.row_factory = sqlite3.Row
+        with open(os.path.join(os.path.dirname(__file__), '..', 'schema.sql'), encoding='utf-8') as f:
+            db.executescript(f.read())
+        t0 = time.perf_counter()
+        seed(db, n, rng)
+        print(f'seeded {n} patients in {time.perf_counter() - t0:.1f} s')
+
+        first_page, next_page = [], []
+        for q in queries(db, rng):
+            t0 = time.perf_counter()
+            rows, cursor = search_patients(db, q, 10)
+            first_page.append(time.perf_counter() - t0)
+            if cursor:
+                t0 = time.perf_counter()
+                search_patients(db, q, 10, cursor)
+                next_page.append(time.perf_counter() - t0)
+
+        for label, samples in (('first page', first_page), ('continuation', next_page)):
+            print(f'{label:>12}: n={len(samples)} p50={percentile(samples, 0.5) * 1000:.2f} ms '
+                  f'p99={percentile(samples, 0.99) * 1000:.2f} ms max={max(samples) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
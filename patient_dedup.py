@@ -0,0 +1,191 @@
+import re
+from difflib import SequenceMatcher
+
+# Blocking key. This must match the idx_patients_contact_key expression index in schema.sql.
+CONTACT_KEY_SQL = (
+    "substr(replace(replace(replace(replace(replace(replace(COALESCE(pat_contact, ''), ' ', ''), '-', ''), "
+    "'(', ''), ')', ''), '+', ''), '.', ''), -10)"
+)
+
+MATCH_THRESHOLD = 0.85
+MIN_NAME_SIMILARITY = 0.85
+MAX_AGE_GAP = 2
+MIN_CONTACT_DIGITS = 7
+BLOCK_LIMIT = 50
+JOB_NAME = 'patient_dedup'
+
+
+def name_key(name):
+    return ' '.join((name or '').replace('.', '').replace(',', '').lower().split())
+
+
+def sorted_name(name):
+    """Token-sorted name key, so 'Dela Cruz, Juan' and 'Juan Dela Cruz' compare equal"""
+    return ' '.join(sorted(name_key(name).split()))
+
+
+def given_name(name):
+    """First given-name token: the first word, or the first word after the comma in 'Surname, Given'"""
+    tokens = name_key((name or '').split(',', 1)[-1]).split()
+    return tokens[0] if tokens else ''
+
+
+def contact_key(contact):
+    return re.sub(r'[ \-()+.]', '', contact or '')[-10:]
+
+
+def similarity(a, b):
+    """Score how likely two patient rows (mappings) describe the same person, 0..1"""
+    # Same owner rule as the booking fast path: guest rows only match guest rows,
+    # and a customer's rows only match that customer's rows
+    if a['customer_id'] != b['customer_id']:
+        return 0.0
+    if a['pat_age'] and b['pat_age'] and abs(a['pat_age'] - b['pat_age']) > MAX_AGE_GAP:
+        return 0.0
+    # Family members share phone numbers and customer accounts, and their given names
+    # are often one letter apart (Juan/Juana, Maria/Mario), so that token must agree exactly
+    if given_name(a['pat_name']) != given_name(b['pat_name']):
+        return 0.0
+    name_sim = SequenceMatcher(None, sorted_name(a['pat_name']), sorted_name(b['pat_name'])).ratio()
+    if name_sim < MIN_NAME_SIMILARITY:
+        return 0.0
+    ca, cb = contact_key(a['pat_contact']), contact_key(b['pat_contact'])
+    same_contact = len(ca) >= MIN_CONTACT_DIGITS and ca == cb
+    same_customer = bool(a['customer_id']) and a['customer_id'] == b['customer_id']
+    addr_a, addr_b = (a['pat_address'] or '').lower().strip(), (b['pat_address'] or '').lower().strip()
+    addr_sim = SequenceMatcher(None, addr_a, addr_b).ratio() if addr_a and addr_b else 0.5
+    return round(0.6 * name_sim + 0.25 * (same_contact or same_customer) + 0.15 * addr_sim, 4)
+
+
+def _candidates(db, patient, before=None):
+    """Rows sharing at least one blocking key with `patient`.
+
+    There is no name block: the name alone scores at most 0.75, so a match
+    always needs the same contact or the same customer, which are the blocks.
+    """
+    clauses, params = [], []
+    ckey = contact_key(patient['pat_contact'])
+    if len(ckey) >= MIN_CONTACT_DIGITS:
+        clauses.append(f"{CONTACT_KEY_SQL} = ?")
+        params.append(ckey)
+    if patient['customer_id']:
+        clauses.append("customer_id = ?")
+        params.append(patient['customer_id'])
+    seen = {}
+    for clause, param in zip(clauses, params):
+        sql = f"SELECT * FROM tbl_patients WHERE {clause}"
+        args = [param]
+        if patient.get('pat_id') is not None:
+            sql += " AND pat_id != ?"
+            args.append(patient['pat_id'])
+        if before is not None:
+            sql += " AND pat_id < ?"
+            args.append(before)
+        sql += " ORDER BY pat_id LIMIT ?"
+        args.append(BLOCK_LIMIT)
+        for r in db.execute(sql, args):
+            seen.setdefault(r['pat_id'], r)
+    return list(seen.values())
+
+
+def find_duplicate(db, patient, before=None):
+    """Return (pat_id, score) of the oldest existing record matching `patient`, or None.
+
+    The oldest match rather than the highest-scoring one, so every duplicate in a
+    group folds into the same surviving record.
+    """
+    best = None
+    for cand in _candidates(db, patient, before):
+        score = similarity(patient, cand)
+        if score >= MATCH_THRESHOLD and (best is None or cand['pat_id'] < best[0]):
+            best = (cand['pat_id'], score)
+    return best
+
+
+def find_existing_patient(db, name, age, contact, address, customer_id):
+    """Booking fast path: reuse a patient with the same owner (guest or customer) instead of inserting a duplicate.
+
+    Only an exact token-sorted name is reused here; fuzzy name matches are left
+    to the audited batch job.
+    """
+    patient = {
+        'pat_id': None, 'pat_name': name, 'pat_age': age, 'pat_contact': contact,
+        'pat_address': address, 'customer_id': customer_id,
+    }
+    best = None
+    for cand in _candidates(db, patient):
+        if sorted_name(cand['pat_name']) != sorted_name(name):
+            continue
+        score = similarity(patient, cand)
+        if score >= MATCH_THRESHOLD and (best is None or score > best[1]):
+            best = (cand['pat_id'], score)
+    return best[0] if best else None
+
+
+def merge_patient(db, keep_id, dup_id, score, chunk_size=500):
+    """Fold patient `dup_id` into `keep_id`.
+
+    Appointments are re-pointed in chunks, each committed on its own so the
+    write lock is held only briefly. A booking can still land on `dup_id`
+    between chunks, so one last re-point runs in the same transaction as the
+    audit row and delete. An interrupted merge is completed by running it again.
+    """
+    moved = 0
+    while True:
+        cur = db.execute(
+            "UPDATE tbl_appointments SET pat_id = ? WHERE app_id IN (SELECT app_id FROM tbl_appointments WHERE pat_id = ? LIMIT ?)",
+            (keep_id, dup_id, chunk_size)
+        )
+        db.commit()
+        moved += cur.rowcount
+        if cur.rowcount < chunk_size:
+            break
+    dup = db.execute("SELECT * FROM tbl_patients WHERE pat_id = ?", (dup_id,)).fetchone()
+    if dup is None:
+        return moved
+    moved += db.execute("UPDATE tbl_appointments SET pat_id = ? WHERE pat_id = ?", (keep_id, dup_id)).rowcount
+    db.execute(
+        "INSERT INTO tbl_patient_merges (kept_pat_id, merged_pat_id, score, appointments_moved, merged_pat_name, merged_pat_age, merged_pat_sex, merged_pat_contact, merged_pat_address, merged_customer_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (keep_id, dup_id, score, moved, dup['pat_name'], dup['pat_age'], dup['pat_sex'], dup['pat_contact'], dup['pat_address'], dup['customer_id'])
+    )
+    db.execute("DELETE FROM tbl_patients WHERE pat_id = ?", (dup_id,))
+    db.commit()
+    return moved
+
+
+def run_dedup(db, batch_size=500, max_batches=None, restart=False, progress=None):
+    """Resumable dedup pass in pat_id order; each patient is merged into the oldest matching earlier record.
+
+    The last fully processed pat_id is checkpointed in tbl_job_state after each
+    batch, so a crashed or stopped run picks up where it left off. Returns
+    (patients_scanned, merges, finished).
+    """
+    if restart:
+        db.execute("DELETE FROM tbl_job_state WHERE job = ?", (JOB_NAME,))
+        db.commit()
+    row = db.execute("SELECT last_id FROM tbl_job_state WHERE job = ?", (JOB_NAME,)).fetchone()
+    last_id = row['last_id'] if row else 0
+    scanned = merges = batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = db.execute(
+            "SELECT * FROM tbl_patients WHERE pat_id > ? ORDER BY pat_id LIMIT ?", (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return scanned, merges, True
+        for p in rows:
+            match = find_duplicate(db, dict(p), before=p['pat_id'])
+            if match:
+                merge_patient(db, match[0], p['pat_id'], match[1])
+                merges += 1
+        last_id = rows[-1]['pat_id']
+        scanned += len(rows)
+        batches += 1
+        db.execute(
+            "INSERT INTO tbl_job_state (job, last_id, updated_at) VALUES (?, ?, datetime('now')) "
+            "ON CONFLICT(job) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at",
+            (JOB_NAME, last_id)
+        )
+        db.commit()
+        if progress:
+            progress(f'scanned up to pat_id {last_id}: {scanned} patients, {merges} merges')
+    return scanned, merges, False
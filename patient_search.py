@@ -0,0 +1,109 @@
+import re
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Must match the contact_digits expression in the trg_patients_fts_* triggers in schema.sql
+CONTACT_DIGITS_SQL = (
+    "replace(replace(replace(replace(replace(replace(COALESCE(pat_contact, ''), ' ', ''), '-', ''), "
+    "'(', ''), ')', ''), '+', ''), '.', '')"
+)
+
+_COLUMNS = "p.pat_id, p.pat_name, p.pat_age, p.pat_sex, p.pat_contact, p.pat_address"
+_PHONE_LIKE = re.compile(r'[\d\s()+.\-]+')
+
+
+def rebuild_patient_index(db):
+    """Repopulate the trigram index from tbl_patients"""
+    db.execute("INSERT INTO tbl_patients_fts (tbl_patients_fts) VALUES ('delete-all')")
+    db.execute(
+        "INSERT INTO tbl_patients_fts (rowid, pat_name, pat_contact, contact_digits, pat_address) "
+        f"SELECT pat_id, pat_name, pat_contact, {CONTACT_DIGITS_SQL}, pat_address FROM tbl_patients"
+    )
+    db.commit()
+
+
+def ensure_patient_index(db):
+    """Backfill the trigram index the first time it is created on a database that already has patients"""
+    if db.execute("SELECT rowid FROM tbl_patients_fts LIMIT 1").fetchone():
+        return
+    if db.execute("SELECT 1 FROM tbl_patients LIMIT 1").fetchone():
+        rebuild_patient_index(db)
+
+
+def _prefix_bounds(q):
+    """[lo, hi) covering every name that starts with q under NOCASE collation"""
+    lo = q.lower()
+    return lo, lo[:-1] + chr(ord(lo[-1]) + 1)
+
+
+def _match_expr(q):
+    """FTS5 query for substring matches, or None when q is too short for trigrams"""
+    terms = []
+    if len(q) >= 3:
+        terms.append('"' + q.replace('"', '""') + '"')
+    digits = re.sub(r'\D', '', q)
+    if len(digits) >= 3 and _PHONE_LIKE.fullmatch(q):
+        terms.append(f'contact_digits : "{digits}"')
+    return ' OR '.join(terms) or None
+
+
+def _name_page(db, q, after_name, after_id, limit):
+    sql = f"SELECT {_COLUMNS} FROM tbl_patients p WHERE (p.pat_name COLLATE NOCASE, p.pat_id) > (?, ?)"
+    params = [after_name, after_id]
+    if q:
+        sql += " AND p.pat_name COLLATE NOCASE >= ? AND p.pat_name COLLATE NOCASE < ?"
+        params.extend(_prefix_bounds(q))
+    sql += " ORDER BY p.pat_name COLLATE NOCASE, p.pat_id LIMIT ?"
+    params.append(limit)
+    return db.execute(sql, params).fetchall()
+
+
+def _substring_page(db, q, match, after_id, limit):
+    # Names starting with q were already returned by the prefix phase
+    lo, hi = _prefix_bounds(q)
+    return db.execute(
+        f"SELECT {_COLUMNS} FROM tbl_patients_fts f JOIN tbl_patients p ON p.pat_id = f.rowid "
+        "WHERE tbl_patients_fts MATCH ? AND f.rowid > ? "
+        "AND NOT (p.pat_name COLLATE NOCASE >= ? AND p.pat_name COLLATE NOCASE < ?) "
+        "ORDER BY f.rowid LIMIT ?",
+        (match, after_id, lo, hi, limit)
+    ).fetchall()
+
+
+def search_patients(db, q, limit=PAGE_SIZE, cursor=None):
+    """Return (rows, next_cursor) for a typeahead query.
+
+    Name-prefix matches come first in name order, then substring matches on
+    name, contact or address in pat_id order. The cursor is opaque to callers:
+    'n:<pat_id>:<name>' continues the prefix phase, 'f:<pat_id>' the substring
+    phase. An empty query pages through every patient by name.
+    """
+    q = ' '.join((q or '').split())
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    phase, after_id, after_name = 'n', 0, ''
+    if cursor:
+        parts = cursor.split(':', 2)
+        try:
+            phase, after_id = parts[0], int(parts[1])
+            after_name = parts[2] if phase == 'n' else ''
+        except (IndexError, ValueError):
+            phase, after_id, after_name = 'n', 0, ''
+
+    results = []
+    if phase == 'n':
+        results = _name_page(db, q, after_name, after_id, limit + 1)
+        if len(results) > limit:
+            last = results[limit - 1]
+            return results[:limit], f"n:{last['pat_id']}:{last['pat_name']}"
+        after_id = 0
+
+    match = _match_expr(q)
+    if not match:
+        return results, None
+    name_hits = len(results)
+    results += _substring_page(db, q, match, after_id, limit - name_hits + 1)
+    if len(results) <= limit:
+        return results, None
+    results = results[:limit]
+    return results, f"f:{results[-1]['pat_id'] if len(results) > name_hits else 0}"
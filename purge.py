@@ -0,0 +1,195 @@
+import sqlite3
+import threading
+import time
+
+from backup import configure_connection
+
+BATCH_SIZE = 500
+PAUSE_SECONDS = 0.05
+LEASE_SECONDS = 60
+
+# Steps run in dependency order: children before the rows they reference.
+# The schema declares ON DELETE CASCADE for patients, dentist rows and their
+# schedules, but connections do not enable PRAGMA foreign_keys, so every
+# cascade is spelled out here rather than left to SQLite.
+RESET_PLAN = [
+    ('tbl_appointments', "1", ()),
+    ('tbl_patient_merges', "1", ()),
+    ('tbl_dentist_exceptions', "1", ()),
+    ('tbl_dentist_hours', "1", ()),
+    ('tbl_dentists', "1", ()),
+    ('tbl_patients', "1", ()),
+    ('tbl_accounts', "acc_role != 'Super Admin'", ()),
+]
+
+
+# A dentist named on an appointment is never deleted; see account_plan
+DENTIST_UNUSED = "NOT EXISTS (SELECT 1 FROM tbl_appointments WHERE dentist_id = ?)"
+
+
+def account_plan(acc_id):
+    """Delete an account and what it owns.
+
+    A customer owns their patient records, so deleting a customer is an erasure:
+    the patients go with their whole history, completed and paid appointments
+    and merge records included, and the revenue rollups drop those rows with them.
+    A dentist owns only their schedule. The appointments they took belong to
+    patients and must stay visible, so a dentist named on any appointment is
+    not deleted at all (deactivate the account instead). The dentist steps
+    repeat that check so a booking made after the job was queued still wins.
+    """
+    return [
+        ('tbl_appointments', "pat_id IN (SELECT pat_id FROM tbl_patients WHERE customer_id = ?)", (acc_id,)),
+        ('tbl_patient_merges', "merged_customer_id = ? OR kept_pat_id IN (SELECT pat_id FROM tbl_patients WHERE customer_id = ?)", (acc_id, acc_id)),
+        ('tbl_patients', "customer_id = ?", (acc_id,)),
+        ('tbl_dentist_exceptions', f"dentist_id = ? AND {DENTIST_UNUSED}", (acc_id, acc_id)),
+        ('tbl_dentist_hours', f"dentist_id = ? AND {DENTIST_UNUSED}", (acc_id, acc_id)),
+        ('tbl_dentists', f"dentist_id = ? AND {DENTIST_UNUSED}", (acc_id, acc_id)),
+        ('tbl_accounts', f"acc_id = ? AND acc_role != 'Super Admin' AND {DENTIST_UNUSED}", (acc_id, acc_id)),
+    ]
+
+
+def dentist_appointments(db, acc_id):
+    """Appointments naming the account as dentist; while there are any it cannot be deleted"""
+    return db.execute("SELECT COUNT(*) FROM tbl_appointments WHERE dentist_id = ?", (acc_id,)).fetchone()[0]
+
+
+def job_plan(job):
+    return RESET_PLAN if job['kind'] == 'reset' else account_plan(job['target_id'])
+
+
+def create_job(db, kind, target_id=None, created_by=None):
+    """Queue a purge and return its job_id; the total is an estimate for progress reporting"""
+    plan = RESET_PLAN if kind == 'reset' else account_plan(target_id)
+    total = sum(db.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0] for table, where, params in plan)
+    cur = db.execute(
+        "INSERT INTO tbl_purge_jobs (kind, target_id, total, created_by) VALUES (?, ?, ?, ?)",
+        (kind, target_id, total, created_by)
+    )
+    db.commit()
+    return cur.lastrowid
+
+
+def active_job(db, kind):
+    return db.execute(
+        "SELECT * FROM tbl_purge_jobs WHERE kind = ? AND status IN ('Pending', 'Running') ORDER BY job_id LIMIT 1",
+        (kind,)
+    ).fetchone()
+
+
+def job_progress(job):
+    row = dict(job)
+    row['steps'] = len(job_plan(job))
+    row['percent'] = 100 if job['status'] == 'Done' else min(99, int(100 * job['deleted'] / job['total'])) if job['total'] else 0
+    return row
+
+
+def _claim(db, job_id):
+    # A Running job whose heartbeat is older than the lease belongs to a worker that died
+    cur = db.execute(
+        "UPDATE tbl_purge_jobs SET status = 'Running', error = NULL, updated_at = datetime('now') "
+        "WHERE job_id = ? AND (status = 'Pending' OR (status = 'Running' AND updated_at < datetime('now', ?)))",
+        (job_id, f'-{LEASE_SECONDS} seconds')
+    )
+    db.commit()
+    return cur.rowcount == 1
+
+
+def run_job(db, job_id, batch_size=BATCH_SIZE, pause=PAUSE_SECONDS):
+    """Run a claimed-or-claimable job to completion. Returns False if another worker owns it.
+
+    Each batch deletes at most `batch_size` rows and records progress in the
+    same transaction, then sleeps so other requests get the write lock.
+    """
+    if not _claim(db, job_id):
+        return False
+    job = db.execute("SELECT * FROM tbl_purge_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    plan = job_plan(job)
+    step, deleted = job['step'], job['deleted']
+    try:
+        while step < len(plan):
+            table, where, params = plan[step]
+            cur = db.execute(
+                f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)",
+                (*params, batch_size)
+            )
+            deleted += cur.rowcount
+            if cur.rowcount < batch_size:
+                step += 1
+            db.execute(
+                "UPDATE tbl_purge_jobs SET step = ?, deleted = ?, updated_at = datetime('now') WHERE job_id = ?",
+                (step, deleted, job_id)
+            )
+            db.commit()
+            if pause:
+                time.sleep(pause)
+        db.execute("UPDATE tbl_purge_jobs SET status = 'Done', updated_at = datetime('now') WHERE job_id = ?", (job_id,))
+        db.commit()
+    except sqlite3.Error as e:
+        db.rollback()
+        db.execute(
+            "UPDATE tbl_purge_jobs SET status = 'Failed', error = ?, updated_at = datetime('now') WHERE job_id = ?",
+            (str(e), job_id)
+        )
+        db.commit()
+    return True
+
+
+def pending_jobs(db):
+    """Jobs that are queued or were interrupted by a crash"""
+    return [r['job_id'] for r in db.execute(
+        "SELECT job_id FROM tbl_purge_jobs WHERE status = 'Pending' "
+        "OR (status = 'Running' AND updated_at < datetime('now', ?)) ORDER BY job_id",
+        (f'-{LEASE_SECONDS} seconds',)
+    )]
+
+
+def requeue_failed(db):
+    db.execute("UPDATE tbl_purge_jobs SET status = 'Pending' WHERE status = 'Failed'")
+    db.commit()
+
+
+def _worker(database, job_ids):
+    db = sqlite3.connect(database, timeout=30)
+    db.row_factory = sqlite3.Row
+    configure_connection(db)
+    try:
+        for job_id in job_ids:
+            run_job(db, job_id)
+    finally:
+        db.close()
+
+
+def start_worker(database, job_ids):
+    """Run jobs on a daemon thread with its own connection so requests are not held up"""
+    if job_ids:
+        threading.Thread(target=_worker, args=(database, list(job_ids)), daemon=True, name='purge-worker').start()
+
+
+def resume_jobs(database, db):
+    """Start a worker for interrupted jobs, and check again once any live-looking lease runs out.
+
+    A Running job updated within the lease may belong to a worker that died
+    just before a quick restart, so it is rechecked after the lease expires
+    rather than left Running for good.
+    """
+    start_worker(database, pending_jobs(db))
+    age = db.execute(
+        "SELECT (julianday('now') - julianday(MIN(updated_at))) * 86400 FROM tbl_purge_jobs "
+        "WHERE status = 'Running' AND updated_at >= datetime('now', ?)",
+        (f'-{LEASE_SECONDS} seconds',)
+    ).fetchone()[0]
+    if age is not None:
+        timer = threading.Timer(max(0, LEASE_SECONDS - age) + 1, _recheck, args=(database,))
+        timer.daemon = True
+        timer.start()
+
+
+def _recheck(database):
+    db = sqlite3.connect(database, timeout=30)
+    db.row_factory = sqlite3.Row
+    configure_connection(db)
+    try:
+        resume_jobs(database, db)
+    finally:
+        db.close()
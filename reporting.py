@@ -0,0 +1,83 @@
+from datetime import date, timedelta
+
+from schedule import CLINIC_SLOTS
+
+# Rollup table -> key column and the expression that derives it from tbl_appointments.
+# These must stay in step with the trg_rollup_appointments_* triggers in schema.sql.
+ROLLUPS = {
+    'tbl_rollup_dentist_daily': ('dentist_id', "dentist_id"),
+    'tbl_rollup_service_daily': ('app_service', "COALESCE(app_service, 'Other')"),
+    'tbl_rollup_payment_daily': ('payment_method', "COALESCE(payment_method, 'Unspecified')"),
+}
+
+_MEASURES = (
+    "COUNT(*), "
+    "SUM(CASE WHEN payment_status = 'Paid' AND app_status != 'Cancelled' THEN COALESCE(app_service_price, 0) ELSE 0 END), "
+    "SUM(app_status = 'Completed'), SUM(app_status = 'Cancelled')"
+)
+
+
+def rebuild_rollups(db):
+    """Recompute every rollup table from tbl_appointments in one transaction"""
+    for table, (key, expr) in ROLLUPS.items():
+        db.execute(f"DELETE FROM {table}")
+        db.execute(
+            f"INSERT INTO {table} (day, {key}, app_count, revenue, completed, cancelled) "
+            f"SELECT app_date, {expr}, {_MEASURES} FROM tbl_appointments GROUP BY app_date, {expr}"
+        )
+    db.commit()
+
+
+def ensure_rollups(db):
+    """Backfill the rollups the first time they are created on a database that already has appointments"""
+    if db.execute("SELECT 1 FROM tbl_rollup_dentist_daily LIMIT 1").fetchone():
+        return
+    if db.execute("SELECT 1 FROM tbl_appointments LIMIT 1").fetchone():
+        rebuild_rollups(db)
+
+
+def _summarize(db, table, key, start, end):
+    return db.execute(
+        f"SELECT {key} AS name, SUM(app_count) AS app_count, ROUND(SUM(revenue), 2) AS revenue, "
+        f"SUM(completed) AS completed, SUM(cancelled) AS cancelled FROM {table} "
+        f"WHERE day BETWEEN ? AND ? GROUP BY {key} HAVING SUM(app_count) > 0 ORDER BY revenue DESC, app_count DESC",
+        (start, end)
+    ).fetchall()
+
+
+def rollup_report(db, compiled, start, end):
+    """Aggregate the rollups over [start, end] (ISO dates) into plain dicts for the admin page and API.
+
+    Dentist utilization is booked (non-cancelled) appointments over the clinic
+    slots their current schedule offers in the range.
+    """
+    names = {r[0]: r[1] for r in db.execute("SELECT acc_id, acc_name FROM tbl_accounts WHERE acc_role = 'Dentist'")}
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    dates = [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+
+    by_dentist = []
+    for r in _summarize(db, 'tbl_rollup_dentist_daily', 'dentist_id', start, end):
+        row = dict(r)
+        row['dentist_id'] = row.pop('name')
+        row['dentist_name'] = names.get(row['dentist_id'], f"#{row['dentist_id']}")
+        capacity = sum(bin(compiled.day_mask(row['dentist_id'], d) & CLINIC_SLOTS).count('1') for d in dates)
+        row['capacity'] = capacity
+        row['utilization'] = round((row['app_count'] - row['cancelled']) / capacity, 4) if capacity else None
+        by_dentist.append(row)
+
+    by_service = [dict(r) for r in _summarize(db, 'tbl_rollup_service_daily', 'app_service', start, end)]
+    by_payment = [dict(r) for r in _summarize(db, 'tbl_rollup_payment_daily', 'payment_method', start, end)]
+    totals = {
+        'app_count': sum(r['app_count'] for r in by_service),
+        'revenue': round(sum(r['revenue'] for r in by_service), 2),
+        'completed': sum(r['completed'] for r in by_service),
+        'cancelled': sum(r['cancelled'] for r in by_service),
+    }
+    return {
+        'start': start,
+        'end': end,
+        'totals': totals,
+        'by_dentist': by_dentist,
+        'by_service': by_service,
+        'by_payment': by_payment,
+    }
@@ -0,0 +1,265 @@
+import heapq
+import sqlite3
+import threading
+from datetime import date, timedelta
+from functools import lru_cache
+from itertools import islice
+
+# ---- Slot grid ----
+# A day is split into 30-minute slots; slot i starts at i * 30 minutes past
+# midnight. A dentist's availability for a day is an int with bit i set when
+# slot i is bookable, so lookups and slot generation are plain bit operations.
+
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+DEFAULT_HOURS = [(day, '08:00', '17:00') for day in range(5)]
+
+
+def to_minutes(hhmm):
+    """Parse 'HH:MM' into minutes past midnight, raising ValueError if malformed"""
+    hours, sep, mins = (hhmm or '').strip().partition(':')
+    if not sep or not hours.isdigit() or not mins.isdigit() or len(mins) != 2:
+        raise ValueError(f'Invalid time: {hhmm!r}')
+    total = int(hours) * 60 + int(mins)
+    if int(mins) >= 60 or total > 24 * 60:
+        raise ValueError(f'Invalid time: {hhmm!r}')
+    return total
+
+
+def normalize_time(hhmm):
+    """Zero-pad 'H:MM' to 'HH:MM' so stored times compare correctly as text"""
+    total = to_minutes(hhmm)
+    return f'{total // 60:02d}:{total % 60:02d}'
+
+
+def slot_time(slot):
+    return f'{slot * SLOT_MINUTES // 60:02d}:{slot * SLOT_MINUTES % 60:02d}'
+
+
+@lru_cache(maxsize=1024)
+def slot_of(hhmm):
+    return to_minutes(hhmm) // SLOT_MINUTES
+
+
+def interval_mask(start, end):
+    """Bits for every slot starting in [start, end)"""
+    first = -(-to_minutes(start) // SLOT_MINUTES)
+    last = -(-to_minutes(end) // SLOT_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def mask_times(mask):
+    return [slot_time(i) for i in range(SLOTS_PER_DAY) if mask >> i & 1]
+
+
+# Clinic booking grid: slots the front desk hands out, with the noon hour kept free
+CLINIC_SLOTS = interval_mask('09:00', '12:00') | interval_mask('13:00', '16:00')
+
+
+def parse_intervals(text):
+    """Parse '09:00-12:00, 13:00-17:00' into [('09:00', '12:00'), ('13:00', '17:00')]"""
+    intervals = []
+    for part in (text or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, sep, end = part.partition('-')
+        start, end = start.strip(), end.strip()
+        if not sep or to_minutes(start) >= to_minutes(end):
+            raise ValueError(f'Invalid interval: {part!r}')
+        intervals.append((normalize_time(start), normalize_time(end)))
+    return intervals
+
+
+def format_intervals(intervals):
+    return ', '.join(f'{s}-{e}' for s, e in intervals)
+
+
+# ---- Compiled schedule cache ----
+
+class CompiledSchedule:
+    def __init__(self, version, weekly, exceptions, holidays):
+        self.version = version
+        self.weekly = weekly          # dentist_id -> 7-tuple of day masks
+        self.exceptions = exceptions  # (dentist_id, 'YYYY-MM-DD') -> (add_mask, remove_mask)
+        self.holidays = holidays      # 'YYYY-MM-DD' -> holiday name
+
+    def has_schedule(self, dentist_id):
+        return dentist_id in self.weekly
+
+    def day_mask(self, dentist_id, app_date):
+        """Bookable slots for a dentist on an ISO date (before subtracting bookings)"""
+        if app_date in self.holidays:
+            return 0
+        week = self.weekly.get(dentist_id)
+        base = week[date.fromisoformat(app_date).weekday()] if week else 0
+        add, remove = self.exceptions.get((dentist_id, app_date), (0, 0))
+        return (base | add) & ~remove
+
+
+_compiled = None
+_compile_lock = threading.Lock()
+
+
+def _schedule_version(db):
+    row = db.execute("SELECT version FROM tbl_schedule_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def compile_schedule(db):
+    version = _schedule_version(db)
+    weekly = {}
+    for r in db.execute("SELECT dentist_id FROM tbl_dentists"):
+        weekly[r[0]] = [0] * 7
+    for r in db.execute("SELECT dentist_id, day_of_week, start_time, end_time FROM tbl_dentist_hours"):
+        week = weekly.setdefault(r[0], [0] * 7)
+        week[r[1]] |= interval_mask(r[2], r[3])
+    weekly = {did: tuple(week) for did, week in weekly.items()}
+
+    exceptions = {}
+    for r in db.execute("SELECT dentist_id, exc_date, start_time, end_time, is_available FROM tbl_dentist_exceptions"):
+        mask = interval_mask(r[2], r[3]) if r[2] and r[3] else FULL_DAY
+        add, remove = exceptions.get((r[0], r[1]), (0, 0))
+        if r[4]:
+            add |= mask
+        else:
+            remove |= mask
+        exceptions[(r[0], r[1])] = (add, remove)
+
+    holidays = {r[0]: r[1] for r in db.execute("SELECT holiday_date, holiday_name FROM tbl_holidays")}
+    return CompiledSchedule(version, weekly, exceptions, holidays)
+
+
+def get_schedule(db):
+    """Return the compiled schedule, rebuilding it only when the version row has moved"""
+    global _compiled
+    version = _schedule_version(db)
+    compiled = _compiled
+    if compiled is None or compiled.version != version:
+        with _compile_lock:
+            compiled = _compiled
+            if compiled is None or compiled.version != version:
+                compiled = _compiled = compile_schedule(db)
+    return compiled
+
+
+# ---- Availability ----
+
+BOOKED_STATUSES = ('Approved', 'Scheduled')
+# Caps the doubling chunks so bookings are only read a week or less ahead of the merge
+MAX_CHUNK_DAYS = 7
+
+
+def booked_masks(db, start_date, end_date, dentist_ids=None):
+    """Map (dentist_id, app_date) to a mask of taken slots for dates in [start_date, end_date].
+
+    `dentist_ids` limits the scan to those dentists; None reads every dentist.
+    """
+    # Slot bits are distinct powers of two, so SUM(DISTINCT ...) is a bitwise OR done inside SQLite
+    sql = (
+        "SELECT dentist_id, app_date, SUM(DISTINCT 1 << ((CAST(substr(app_time, 1, 2) AS INTEGER) * 60"
+        f" + CAST(substr(app_time, 4, 2) AS INTEGER)) / {SLOT_MINUTES})) FROM tbl_appointments"
+        " WHERE app_status IN (?, ?) AND app_time GLOB '[0-2][0-9]:[0-5][0-9]'"
+    )
+    params = [*BOOKED_STATUSES]
+    # An equality on app_date lets the dentist_id IN list seek into idx_appointments_date_dentist too
+    if start_date == end_date:
+        sql += " AND app_date = ?"
+        params.append(start_date)
+    else:
+        sql += " AND app_date BETWEEN ? AND ?"
+        params.extend([start_date, end_date])
+    if dentist_ids is not None:
+        sql += f" AND dentist_id IN ({', '.join('?' * len(dentist_ids))})"
+        params.extend(dentist_ids)
+    sql += " GROUP BY app_date, dentist_id"
+    return {(r[0], r[1]): r[2] for r in db.execute(sql, params)}
+
+
+def _dentist_slots(compiled, dentist_id, dates, booked):
+    """Yield (app_date, slot, dentist_id) for a dentist's open slots in chronological order"""
+    for app_date in dates:
+        mask = compiled.day_mask(dentist_id, app_date) & CLINIC_SLOTS & ~booked.get((dentist_id, app_date), 0)
+        while mask:
+            low = mask & -mask
+            yield app_date, low.bit_length() - 1, dentist_id
+            mask ^= low
+
+
+def earliest_slots(db, compiled, dentist_ids, start, days, limit):
+    """Return the first `limit` open (app_date, app_time, dentist_id) across dentists.
+
+    The window is walked in chunks that double in length (1, 2, 4, ... days)
+    up to MAX_CHUNK_DAYS. Within a chunk each dentist contributes a lazy
+    chronological stream and heapq.merge pulls from them in order. Bookings are
+    loaded only for chunks the search reaches, one date at a time, and only for
+    the dentists in `dentist_ids` who work that date.
+    """
+    found = []
+    offset, chunk = 0, 1
+    while offset < days and len(found) < limit:
+        dates = [(start + timedelta(days=i)).isoformat() for i in range(offset, min(offset + chunk, days))]
+        booked = {}
+        for app_date in dates:
+            working = [did for did in dentist_ids if compiled.day_mask(did, app_date) & CLINIC_SLOTS]
+            if working:
+                booked.update(booked_masks(db, app_date, app_date, working))
+        streams = [_dentist_slots(compiled, did, dates, booked) for did in dentist_ids]
+        found.extend(islice(heapq.merge(*streams), limit - len(found)))
+        offset, chunk = offset + chunk, min(chunk * 2, MAX_CHUNK_DAYS)
+    return [(d, slot_time(slot), did) for d, slot, did in found]
+
+
+# ---- Writes ----
+
+def weekly_hours(db, dentist_id):
+    """Return a list of 7 interval lists, Monday first"""
+    week = [[] for _ in range(7)]
+    for r in db.execute(
+        "SELECT day_of_week, start_time, end_time FROM tbl_dentist_hours WHERE dentist_id=? ORDER BY day_of_week, start_time",
+        (dentist_id,)
+    ):
+        week[r[0]].append((r[1], r[2]))
+    return week
+
+
+def set_weekly_hours(db, dentist_id, hours):
+    """Replace a dentist's weekly intervals with (day_of_week, start, end) rows; caller commits"""
+    db.execute("DELETE FROM tbl_dentist_hours WHERE dentist_id=?", (dentist_id,))
+    db.executemany(
+        "INSERT INTO tbl_dentist_hours (dentist_id, day_of_week, start_time, end_time) VALUES (?, ?, ?, ?)",
+        [(dentist_id, day, start, end) for day, start, end in hours]
+    )
+
+
+# ---- Migration ----
+
+def migrate_legacy_hours(db):
+    """Move tbl_dentists.work_start/work_end/work_days into tbl_dentist_hours and drop the old columns"""
+    columns = {r[1] for r in db.execute("PRAGMA table_info(tbl_dentists)")}
+    if 'work_start' not in columns:
+        return
+    has_hours = {r[0] for r in db.execute("SELECT DISTINCT dentist_id FROM tbl_dentist_hours")}
+    for r in db.execute("SELECT dentist_id, work_start, work_end, work_days FROM tbl_dentists").fetchall():
+        if r[0] in has_hours:
+            continue
+        try:
+            start, end = normalize_time(r[1] or '08:00'), normalize_time(r[2] or '17:00')
+        except ValueError:
+            continue
+        if start >= end:
+            continue
+        days = {d.strip() for d in (r[3] or '').split(',')}
+        set_weekly_hours(db, r[0], [(i, start, end) for i, name in enumerate(DAY_NAMES) if name in days])
+    for column in ('work_start', 'work_end', 'work_days'):
+        try:
+            db.execute(f"ALTER TABLE tbl_dentists DROP COLUMN {column}")
+        except sqlite3.OperationalError:
+            # SQLite < 3.35 cannot drop columns; the legacy values are simply ignored
+            pass
+    db.commit()
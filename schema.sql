@@ -21,15 +21,151 @@ CREATE TABLE IF NOT EXISTS tbl_patients (
   FOREIGN KEY (customer_id) REFERENCES tbl_accounts(acc_id) ON DELETE CASCADE
 );
 
+-- Patient typeahead: a NOCASE name index serves prefix lookups and a
+-- contentless trigram index serves substring matches on name, contact
+-- (raw and digits-only, so partial phone numbers match) and address.
+CREATE INDEX IF NOT EXISTS idx_patients_name ON tbl_patients(pat_name COLLATE NOCASE, pat_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS tbl_patients_fts USING fts5(
+  pat_name, pat_contact, contact_digits, pat_address,
+  content='', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_patients_fts_ins AFTER INSERT ON tbl_patients
+BEGIN
+  INSERT INTO tbl_patients_fts (rowid, pat_name, pat_contact, contact_digits, pat_address)
+  VALUES (NEW.pat_id, NEW.pat_name, NEW.pat_contact, replace(replace(replace(replace(replace(replace(COALESCE(NEW.pat_contact, ''), ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', ''), NEW.pat_address);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_patients_fts_del AFTER DELETE ON tbl_patients
+BEGIN
+  INSERT INTO tbl_patients_fts (tbl_patients_fts, rowid, pat_name, pat_contact, contact_digits, pat_address)
+  VALUES ('delete', OLD.pat_id, OLD.pat_name, OLD.pat_contact, replace(replace(replace(replace(replace(replace(COALESCE(OLD.pat_contact, ''), ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', ''), OLD.pat_address);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_patients_fts_upd AFTER UPDATE OF pat_name, pat_contact, pat_address ON tbl_patients
+BEGIN
+  INSERT INTO tbl_patients_fts (tbl_patients_fts, rowid, pat_name, pat_contact, contact_digits, pat_address)
+  VALUES ('delete', OLD.pat_id, OLD.pat_name, OLD.pat_contact, replace(replace(replace(replace(replace(replace(COALESCE(OLD.pat_contact, ''), ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', ''), OLD.pat_address);
+  INSERT INTO tbl_patients_fts (rowid, pat_name, pat_contact, contact_digits, pat_address)
+  VALUES (NEW.pat_id, NEW.pat_name, NEW.pat_contact, replace(replace(replace(replace(replace(replace(COALESCE(NEW.pat_contact, ''), ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', ''), NEW.pat_address);
+END;
+
+-- Dedup blocking key as an expression index; patient_dedup.CONTACT_KEY_SQL
+-- must use the same expression for SQLite to pick it up.
+DROP INDEX IF EXISTS idx_patients_name_key;
+CREATE INDEX IF NOT EXISTS idx_patients_contact_key ON tbl_patients(
+  substr(replace(replace(replace(replace(replace(replace(COALESCE(pat_contact, ''), ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', ''), -10)
+);
+CREATE INDEX IF NOT EXISTS idx_patients_customer ON tbl_patients(customer_id);
+
+-- Audit trail of patient merges, keeping the removed row so a merge can be reviewed or undone
+CREATE TABLE IF NOT EXISTS tbl_patient_merges (
+  merge_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  kept_pat_id INTEGER NOT NULL,
+  merged_pat_id INTEGER NOT NULL,
+  score REAL NOT NULL,
+  appointments_moved INTEGER NOT NULL DEFAULT 0,
+  merged_pat_name TEXT,
+  merged_pat_age INTEGER,
+  merged_pat_sex TEXT,
+  merged_pat_contact TEXT,
+  merged_pat_address TEXT,
+  merged_customer_id INTEGER,
+  merged_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+-- Background bulk deletes (super admin reset, account deletion), resumable by step
+CREATE TABLE IF NOT EXISTS tbl_purge_jobs (
+  job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  kind TEXT NOT NULL CHECK(kind IN ('reset','account')),
+  target_id INTEGER,
+  status TEXT NOT NULL DEFAULT 'Pending' CHECK(status IN ('Pending','Running','Done','Failed')),
+  step INTEGER NOT NULL DEFAULT 0,
+  deleted INTEGER NOT NULL DEFAULT 0,
+  total INTEGER NOT NULL DEFAULT 0,
+  error TEXT,
+  created_by INTEGER,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+-- Checkpoint for resumable batch jobs
+CREATE TABLE IF NOT EXISTS tbl_job_state (
+  job TEXT PRIMARY KEY,
+  last_id INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
 CREATE TABLE IF NOT EXISTS tbl_dentists (
   dentist_id INTEGER PRIMARY KEY,
   specialty TEXT,
-  work_start TEXT DEFAULT '08:00',
-  work_end TEXT DEFAULT '17:00',
-  work_days TEXT DEFAULT 'Monday,Tuesday,Wednesday,Thursday,Friday',
   FOREIGN KEY (dentist_id) REFERENCES tbl_accounts(acc_id) ON DELETE CASCADE
 );
 
+-- Weekly working intervals; day_of_week follows Python's weekday() (0 = Monday)
+CREATE TABLE IF NOT EXISTS tbl_dentist_hours (
+  hours_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  dentist_id INTEGER NOT NULL,
+  day_of_week INTEGER NOT NULL CHECK(day_of_week BETWEEN 0 AND 6),
+  start_time TEXT NOT NULL,
+  end_time TEXT NOT NULL CHECK(end_time > start_time),
+  FOREIGN KEY (dentist_id) REFERENCES tbl_dentists(dentist_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_dentist_hours_dentist ON tbl_dentist_hours(dentist_id, day_of_week);
+
+-- Dated overrides: no times + is_available=0 is a full day of leave,
+-- times + is_available=0 blocks that window, times + is_available=1 adds extra hours
+CREATE TABLE IF NOT EXISTS tbl_dentist_exceptions (
+  exc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  dentist_id INTEGER NOT NULL,
+  exc_date TEXT NOT NULL,
+  start_time TEXT,
+  end_time TEXT,
+  is_available INTEGER NOT NULL DEFAULT 0 CHECK(is_available IN (0,1)),
+  reason TEXT,
+  FOREIGN KEY (dentist_id) REFERENCES tbl_dentists(dentist_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_dentist_exceptions_dentist ON tbl_dentist_exceptions(dentist_id, exc_date);
+
+CREATE TABLE IF NOT EXISTS tbl_holidays (
+  holiday_date TEXT PRIMARY KEY,
+  holiday_name TEXT NOT NULL
+);
+
+-- Bumped by triggers on every schedule write so compiled lookups know when to rebuild
+CREATE TABLE IF NOT EXISTS tbl_schedule_version (
+  id INTEGER PRIMARY KEY CHECK(id = 1),
+  version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO tbl_schedule_version (id, version) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_dentist_hours_ins AFTER INSERT ON tbl_dentist_hours
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_dentist_hours_upd AFTER UPDATE ON tbl_dentist_hours
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_dentist_hours_del AFTER DELETE ON tbl_dentist_hours
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_dentist_exceptions_ins AFTER INSERT ON tbl_dentist_exceptions
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_dentist_exceptions_upd AFTER UPDATE ON tbl_dentist_exceptions
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_dentist_exceptions_del AFTER DELETE ON tbl_dentist_exceptions
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_dentists_ins AFTER INSERT ON tbl_dentists
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_dentists_del AFTER DELETE ON tbl_dentists
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_holidays_ins AFTER INSERT ON tbl_holidays
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_holidays_upd AFTER UPDATE ON tbl_holidays
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+CREATE TRIGGER IF NOT EXISTS trg_holidays_del AFTER DELETE ON tbl_holidays
+BEGIN UPDATE tbl_schedule_version SET version = version + 1 WHERE id = 1; END;
+
 CREATE TABLE IF NOT EXISTS tbl_services (
   service_id INTEGER PRIMARY KEY AUTOINCREMENT,
   service_name TEXT NOT NULL UNIQUE,
@@ -54,6 +190,129 @@ CREATE TABLE IF NOT EXISTS tbl_appointments (
   FOREIGN KEY (dentist_id) REFERENCES tbl_accounts(acc_id)
 );
 
+CREATE INDEX IF NOT EXISTS idx_appointments_patient ON tbl_appointments(pat_id);
+
+-- Covers the booked-slot lookups used by availability and slot search
+CREATE INDEX IF NOT EXISTS idx_appointments_date_dentist ON tbl_appointments(app_date, dentist_id, app_status, app_time);
+
+-- Daily reporting rollups keyed by appointment date. revenue counts paid,
+-- non-cancelled appointments. The triggers below keep them in step with
+-- tbl_appointments; reporting.rebuild_rollups recomputes them from scratch.
+CREATE TABLE IF NOT EXISTS tbl_rollup_dentist_daily (
+  day TEXT NOT NULL,
+  dentist_id INTEGER NOT NULL,
+  app_count INTEGER NOT NULL DEFAULT 0,
+  revenue REAL NOT NULL DEFAULT 0,
+  completed INTEGER NOT NULL DEFAULT 0,
+  cancelled INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, dentist_id)
+);
+
+CREATE TABLE IF NOT EXISTS tbl_rollup_service_daily (
+  day TEXT NOT NULL,
+  app_service TEXT NOT NULL,
+  app_count INTEGER NOT NULL DEFAULT 0,
+  revenue REAL NOT NULL DEFAULT 0,
+  completed INTEGER NOT NULL DEFAULT 0,
+  cancelled INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, app_service)
+);
+
+CREATE TABLE IF NOT EXISTS tbl_rollup_payment_daily (
+  day TEXT NOT NULL,
+  payment_method TEXT NOT NULL,
+  app_count INTEGER NOT NULL DEFAULT 0,
+  revenue REAL NOT NULL DEFAULT 0,
+  completed INTEGER NOT NULL DEFAULT 0,
+  cancelled INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, payment_method)
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_appointments_ins AFTER INSERT ON tbl_appointments
+BEGIN
+  INSERT INTO tbl_rollup_dentist_daily (day, dentist_id, app_count, revenue, completed, cancelled)
+  VALUES (NEW.app_date, NEW.dentist_id, 1,
+          CASE WHEN NEW.payment_status = 'Paid' AND NEW.app_status != 'Cancelled' THEN COALESCE(NEW.app_service_price, 0) ELSE 0 END,
+          (NEW.app_status = 'Completed'), (NEW.app_status = 'Cancelled'))
+  ON CONFLICT(day, dentist_id) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+  INSERT INTO tbl_rollup_service_daily (day, app_service, app_count, revenue, completed, cancelled)
+  VALUES (NEW.app_date, COALESCE(NEW.app_service, 'Other'), 1,
+          CASE WHEN NEW.payment_status = 'Paid' AND NEW.app_status != 'Cancelled' THEN COALESCE(NEW.app_service_price, 0) ELSE 0 END,
+          (NEW.app_status = 'Completed'), (NEW.app_status = 'Cancelled'))
+  ON CONFLICT(day, app_service) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+  INSERT INTO tbl_rollup_payment_daily (day, payment_method, app_count, revenue, completed, cancelled)
+  VALUES (NEW.app_date, COALESCE(NEW.payment_method, 'Unspecified'), 1,
+          CASE WHEN NEW.payment_status = 'Paid' AND NEW.app_status != 'Cancelled' THEN COALESCE(NEW.app_service_price, 0) ELSE 0 END,
+          (NEW.app_status = 'Completed'), (NEW.app_status = 'Cancelled'))
+  ON CONFLICT(day, payment_method) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_appointments_del AFTER DELETE ON tbl_appointments
+BEGIN
+  INSERT INTO tbl_rollup_dentist_daily (day, dentist_id, app_count, revenue, completed, cancelled)
+  VALUES (OLD.app_date, OLD.dentist_id, -1,
+          -CASE WHEN OLD.payment_status = 'Paid' AND OLD.app_status != 'Cancelled' THEN COALESCE(OLD.app_service_price, 0) ELSE 0 END,
+          -(OLD.app_status = 'Completed'), -(OLD.app_status = 'Cancelled'))
+  ON CONFLICT(day, dentist_id) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+  INSERT INTO tbl_rollup_service_daily (day, app_service, app_count, revenue, completed, cancelled)
+  VALUES (OLD.app_date, COALESCE(OLD.app_service, 'Other'), -1,
+          -CASE WHEN OLD.payment_status = 'Paid' AND OLD.app_status != 'Cancelled' THEN COALESCE(OLD.app_service_price, 0) ELSE 0 END,
+          -(OLD.app_status = 'Completed'), -(OLD.app_status = 'Cancelled'))
+  ON CONFLICT(day, app_service) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+  INSERT INTO tbl_rollup_payment_daily (day, payment_method, app_count, revenue, completed, cancelled)
+  VALUES (OLD.app_date, COALESCE(OLD.payment_method, 'Unspecified'), -1,
+          -CASE WHEN OLD.payment_status = 'Paid' AND OLD.app_status != 'Cancelled' THEN COALESCE(OLD.app_service_price, 0) ELSE 0 END,
+          -(OLD.app_status = 'Completed'), -(OLD.app_status = 'Cancelled'))
+  ON CONFLICT(day, payment_method) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_appointments_upd
+AFTER UPDATE OF app_date, dentist_id, app_service, app_service_price, app_status, payment_method, payment_status ON tbl_appointments
+BEGIN
+  INSERT INTO tbl_rollup_dentist_daily (day, dentist_id, app_count, revenue, completed, cancelled)
+  VALUES (OLD.app_date, OLD.dentist_id, -1,
+          -CASE WHEN OLD.payment_status = 'Paid' AND OLD.app_status != 'Cancelled' THEN COALESCE(OLD.app_service_price, 0) ELSE 0 END,
+          -(OLD.app_status = 'Completed'), -(OLD.app_status = 'Cancelled'))
+  ON CONFLICT(day, dentist_id) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+  INSERT INTO tbl_rollup_dentist_daily (day, dentist_id, app_count, revenue, completed, cancelled)
+  VALUES (NEW.app_date, NEW.dentist_id, 1,
+          CASE WHEN NEW.payment_status = 'Paid' AND NEW.app_status != 'Cancelled' THEN COALESCE(NEW.app_service_price, 0) ELSE 0 END,
+          (NEW.app_status = 'Completed'), (NEW.app_status = 'Cancelled'))
+  ON CONFLICT(day, dentist_id) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+  INSERT INTO tbl_rollup_service_daily (day, app_service, app_count, revenue, completed, cancelled)
+  VALUES (OLD.app_date, COALESCE(OLD.app_service, 'Other'), -1,
+          -CASE WHEN OLD.payment_status = 'Paid' AND OLD.app_status != 'Cancelled' THEN COALESCE(OLD.app_service_price, 0) ELSE 0 END,
+          -(OLD.app_status = 'Completed'), -(OLD.app_status = 'Cancelled'))
+  ON CONFLICT(day, app_service) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+  INSERT INTO tbl_rollup_service_daily (day, app_service, app_count, revenue, completed, cancelled)
+  VALUES (NEW.app_date, COALESCE(NEW.app_service, 'Other'), 1,
+          CASE WHEN NEW.payment_status = 'Paid' AND NEW.app_status != 'Cancelled' THEN COALESCE(NEW.app_service_price, 0) ELSE 0 END,
+          (NEW.app_status = 'Completed'), (NEW.app_status = 'Cancelled'))
+  ON CONFLICT(day, app_service) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+  INSERT INTO tbl_rollup_payment_daily (day, payment_method, app_count, revenue, completed, cancelled)
+  VALUES (OLD.app_date, COALESCE(OLD.payment_method, 'Unspecified'), -1,
+          -CASE WHEN OLD.payment_status = 'Paid' AND OLD.app_status != 'Cancelled' THEN COALESCE(OLD.app_service_price, 0) ELSE 0 END,
+          -(OLD.app_status = 'Completed'), -(OLD.app_status = 'Cancelled'))
+  ON CONFLICT(day, payment_method) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+  INSERT INTO tbl_rollup_payment_daily (day, payment_method, app_count, revenue, completed, cancelled)
+  VALUES (NEW.app_date, COALESCE(NEW.payment_method, 'Unspecified'), 1,
+          CASE WHEN NEW.payment_status = 'Paid' AND NEW.app_status != 'Cancelled' THEN COALESCE(NEW.app_service_price, 0) ELSE 0 END,
+          (NEW.app_status = 'Completed'), (NEW.app_status = 'Cancelled'))
+  ON CONFLICT(day, payment_method) DO UPDATE SET app_count = app_count + excluded.app_count, revenue = revenue + excluded.revenue,
+    completed = completed + excluded.completed, cancelled = cancelled + excluded.cancelled;
+END;
+
 CREATE TABLE IF NOT EXISTS tbl_logs (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   actor_id INTEGER,